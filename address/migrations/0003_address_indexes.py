@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('address', '0002_address_created_at_address_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', '-created_at'], name='address_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(condition=models.Q(('is_default', True)), fields=['user'], name='address_user_default_idx'),
+        ),
+    ]
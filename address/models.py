@@ -19,5 +19,13 @@ class Address(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Address book of a user, newest first
+            models.Index(fields=['user', '-created_at'], name='address_user_recent_idx'),
+            # Each user has at most one default address, so this partial index stays tiny
+            models.Index(fields=['user'], condition=models.Q(is_default=True), name='address_user_default_idx'),
+        ]
+
     def __str__(self):
         return f"{self.contact_name} - {self.address}, {self.city}"
@@ -2,6 +2,7 @@ from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from core.compiled import CompiledListMixin
 from .models import Address
 from .serializers import AddressSerializer
 
@@ -23,7 +24,7 @@ class AddAddressView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserAddressesView(ListAPIView):
+class UserAddressesView(CompiledListMixin, ListAPIView):
     serializer_class = AddressSerializer
 
     def get_queryset(self):
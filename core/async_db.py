@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import prefetch_related_objects
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def stamp_connection(sender, connection, **kwargs):
+    connection.opened_at = time.monotonic()
+
+
+def _recycle(connection):
+    # close_old_connections() would apply CONN_MAX_AGE, which the ASGI deployment sets to 0 for its per-request
+    # threads and would reconnect on every call. Pool threads only drop connections that are stale or broken.
+    if connection.connection is None:
+        return
+    if connection.errors_occurred:
+        if not connection.is_usable():
+            connection.close()
+            return
+        connection.errors_occurred = False
+    if time.monotonic() - getattr(connection, 'opened_at', 0) >= settings.ASYNC_DB_CONN_MAX_AGE:
+        connection.close()
+    else:
+        # With CONN_HEALTH_CHECKS, the connection is checked again before its next query
+        connection.health_check_done = False
+
+
+def _run_pooled(call):
+    # Pool threads outlive requests, so the request signals never recycle their connections
+    for connection in connections.all(initialized_only=True):
+        _recycle(connection)
+    return call()
+
+
+async def run_query(call):
+    """
+    Run a blocking ORM call on a shared worker thread.
+
+    Django's async ORM runs queries on a thread created for each request, so
+    every request opens a new connection. The shared threads keep theirs for
+    ASYNC_DB_CONN_MAX_AGE seconds, so the connection setup (and, for SQLite,
+    the pragmas) isn't paid on every request.
+    """
+    return await sync_to_async(_run_pooled, thread_sensitive=False)(call)
+
+
+async def gather_queries(*calls):
+    # Independent calls run at the same time, each on its own thread and connection
+    return await asyncio.gather(*(run_query(call) for call in calls))
+
+
+async def aprefetch(instances, *lookups):
+    # Independent relations of the same objects are loaded concurrently, one query each
+    instances = list(instances)
+    for instance in instances:
+        # Created up front, so the worker threads never race to create it
+        if not hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache = {}
+    await gather_queries(*(lambda lookup=lookup: prefetch_related_objects(instances, lookup) for lookup in lookups))
+    return instances
@@ -0,0 +1,71 @@
+import asyncio
+
+from django.conf import settings
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.async_db import run_query
+
+
+class AsyncAPIView(APIView):
+    """
+    An APIView whose handlers are coroutines.
+
+    Authentication, permissions, content negotiation and rendering are the
+    same as in the sync views, so both return identical payloads. The
+    authentication step can hit the database, so it runs through run_query.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await run_query(lambda: self.initial(request, *args, **kwargs))
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncListMixin:
+    """`list()` for generic list views, with the page fetched off the event loop and a prefetch hook."""
+
+    async def aprefetch_related(self, objects):
+        # Load whatever the serializer needs for the page
+        pass
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if isinstance(queryset, Response):
+            # Some list views answer a missing parameter from get_queryset
+            return queryset
+
+        queryset = self.filter_queryset(queryset)
+        page = await run_query(lambda: self.paginate_queryset(queryset))
+        objects = page if page is not None else await run_query(lambda: list(queryset))
+        await self.aprefetch_related(objects)
+
+        data = self.get_serializer(objects, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+def read_view(sync_view, async_view, **initkwargs):
+    # The ASGI deployment sets ASYNC_READ_VIEWS, so the same URLs are served by the async variants
+    view_class = async_view if settings.ASYNC_READ_VIEWS else sync_view
+    return view_class.as_view(**initkwargs)
@@ -0,0 +1,50 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import TieredCache
+
+# Local entries are short-lived: a token deleted through another worker is only dropped from this
+# worker's LRU when the entry expires, while the shared entry is invalidated at once
+auth_cache = TieredCache('auth', max_entries=4096, local_timeout=5)
+
+TOKEN_TIMEOUT = 10 * 60
+
+
+def token_namespace(key):
+    return f"token:{key}"
+
+
+def token_timeout():
+    # Without REDIS_URL the "shared" entries live in each worker's LocMemCache and are only invalidated in
+    # the worker that deleted the token, so they must not outlive the local ones (see TieredCache.shared_timeout)
+    return auth_cache.shared_timeout(TOKEN_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers the token and its user.
+
+    A hit in the in-process LRU costs no query. A hit in the shared cache
+    costs no query either, but two cache round trips: the namespace version
+    and the entry. Entries are invalidated by the signals in core/signals.py
+    when the token is deleted (djoser logout) or the user is saved, which
+    covers deactivation. With a per-process default cache, entries only last
+    as long as the local ones (see token_timeout).
+    """
+
+    def authenticate_credentials(self, key):
+        token = auth_cache.get(token_namespace(key), 'token')
+        if token is None:
+            # Inactive users and unknown keys are not cached, so they are checked against the database every time
+            user, token = super().authenticate_credentials(key)
+            auth_cache.set(token_namespace(key), 'token', token, token_timeout())
+            return user, token
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+
+def invalidate_token(key):
+    auth_cache.invalidate(token_namespace(key))
@@ -0,0 +1,264 @@
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.async_db import run_query
+
+# Backends whose entries never leave the worker process
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias='default'):
+    """Whether every worker sees the same entries in the `alias` cache, so invalidations reach all of them."""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+class LRUCache:
+    """Bounded in-process cache with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        # predicate(key, value) picks the entries to drop
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    In-process LRU in front of a shared Django cache backend.
+
+    Entries live under namespaces. Every namespace has a version number in the
+    shared backend, and invalidating a namespace bumps that version, so all
+    workers stop seeing the old entries. An entry can also depend on other
+    namespaces (`depends_on`), such as the store nested in a product: their
+    versions are saved with it and checked on shared hits, so invalidating
+    the store drops every entry built from it. Local entries are only kept
+    for `local_timeout` seconds so other workers' LRUs catch up quickly.
+    When the backend is process-local (no REDIS_URL), invalidations never
+    reach the other workers, so its entries get the same short timeout.
+    """
+
+    def __init__(self, name, backend='default', max_entries=1024, local_timeout=10):
+        self.name = name
+        self.backend = backend
+        self.local = LRUCache(max_entries)
+        self.local_timeout = local_timeout
+        self.counters = defaultdict(lambda: {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+
+    @property
+    def shared(self):
+        return caches[self.backend]
+
+    def shared_timeout(self, timeout):
+        # Other workers never see the invalidations of a process-local backend, as with their LRUs
+        return timeout if is_shared_cache(self.backend) else min(timeout, self.local_timeout)
+
+    def _version_key(self, namespace):
+        return f"{self.name}:version:{namespace}"
+
+    def _version(self, namespace):
+        return self.shared.get_or_set(self._version_key(namespace), 1, timeout=None)
+
+    @staticmethod
+    def make_key(params):
+        # Build a stable key from the query parameters regardless of their order
+        items = sorted((key, tuple(sorted(params.getlist(key)))) for key in params.keys())
+        return hashlib.md5(repr(items).encode()).hexdigest()
+
+    def get(self, namespace, key):
+        # Per-object namespaces such as "singles:42" are counted under their endpoint
+        counters = self.counters[namespace.split(':')[0]]
+
+        local_key = f"{namespace}:{key}"
+        entry = self.local.get(local_key)
+        if entry is not None:
+            counters['local_hits'] += 1
+            return entry[0]
+
+        entry = self.shared.get(f"{self.name}:{namespace}:{self._version(namespace)}:{key}")
+        if entry is not None and self._is_current(entry[1]):
+            counters['shared_hits'] += 1
+            self.local.set(local_key, (entry[0], tuple(entry[1])), self.local_timeout)
+            return entry[0]
+
+        counters['misses'] += 1
+        return None
+
+    def set(self, namespace, key, value, timeout, depends_on=()):
+        # Shared entries keep the versions of the namespaces they depend on, local ones only their names
+        dependencies = self._versions(depends_on) if depends_on else {}
+        self.shared.set(f"{self.name}:{namespace}:{self._version(namespace)}:{key}", (value, dependencies),
+                        self.shared_timeout(timeout))
+        self.local.set(f"{namespace}:{key}", (value, tuple(dependencies)), min(timeout, self.local_timeout))
+
+    def _versions(self, namespaces):
+        # _version() of many namespaces in one round trip; only namespaces never seen before need their own
+        version_keys = {namespace: self._version_key(namespace) for namespace in namespaces}
+        versions = self.shared.get_many(list(version_keys.values()))
+        return {namespace: versions.get(key) or self._version(namespace) for namespace, key in version_keys.items()}
+
+    def _is_current(self, dependencies):
+        return not dependencies or self._versions(dependencies) == dependencies
+
+    def get_many(self, items):
+        """
+        get() for many (namespace, key) pairs, returning the hits by pair.
+
+        Whatever the local LRU misses is read from the shared backend with
+        one get_many for the namespace versions, one for the entries and one
+        for the versions of the namespaces the entries depend on.
+        """
+        found = {}
+        remote = []
+        for namespace, key in items:
+            entry = self.local.get(f"{namespace}:{key}")
+            if entry is not None:
+                self.counters[namespace.split(':')[0]]['local_hits'] += 1
+                found[namespace, key] = entry[0]
+            else:
+                remote.append((namespace, key))
+        if not remote:
+            return found
+
+        versions = self._versions({namespace for namespace, _ in remote})
+        shared_keys = {f"{self.name}:{namespace}:{versions[namespace]}:{key}": (namespace, key)
+                       for namespace, key in remote}
+        entries = self.shared.get_many(list(shared_keys))
+        dependencies = {namespace for _, entry_dependencies in entries.values() for namespace in entry_dependencies}
+        current = self._versions(dependencies) if dependencies else {}
+
+        for shared_key, (namespace, key) in shared_keys.items():
+            counters = self.counters[namespace.split(':')[0]]
+            entry = entries.get(shared_key)
+            if entry is None or any(current[name] != version for name, version in entry[1].items()):
+                counters['misses'] += 1
+                continue
+            counters['shared_hits'] += 1
+            found[namespace, key] = entry[0]
+            self.local.set(f"{namespace}:{key}", (entry[0], tuple(entry[1])), self.local_timeout)
+        return found
+
+    def set_many(self, items, timeout, depends_on=None):
+        # `items` maps (namespace, key) pairs to values; depends_on(value) lists the namespaces a value depends on
+        names = {pair: tuple(depends_on(value)) if depends_on else () for pair, value in items.items()}
+        namespaces = {namespace for namespace, _ in items} | {name for deps in names.values() for name in deps}
+        versions = self._versions(namespaces)
+
+        entries = {}
+        for (namespace, key), value in items.items():
+            dependencies = {name: versions[name] for name in names[namespace, key]}
+            entries[f"{self.name}:{namespace}:{versions[namespace]}:{key}"] = (value, dependencies)
+            self.local.set(f"{namespace}:{key}", (value, names[namespace, key]), min(timeout, self.local_timeout))
+        self.shared.set_many(entries, self.shared_timeout(timeout))
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            try:
+                self.shared.incr(self._version_key(namespace))
+            except ValueError:
+                # The version expired or was never set, so there is nothing to invalidate remotely
+                pass
+            prefix = f"{namespace}:"
+            self.local.delete_where(lambda key, entry: key.startswith(prefix) or namespace in entry[1])
+
+    def stats(self):
+        return {
+            'local_entries': len(self.local),
+            'max_local_entries': self.local.max_entries,
+            'namespaces': {namespace: dict(counts) for namespace, counts in self.counters.items()},
+        }
+
+
+def cache_response(cache, namespace, timeout=60, depends_on=None):
+    """
+    Serves a view's GET responses from a TieredCache, keyed by the query parameters.
+
+    `namespace` is either a string or a callable taking the request, so that a
+    single object can be cached and invalidated on its own. `depends_on(data)`
+    optionally lists other namespaces the payload is built from. Async view
+    methods are supported; the cache is then read and written through
+    run_query, as the shared backend may be Redis.
+    """
+
+    def decorator(view_method):
+        if inspect.iscoroutinefunction(view_method):
+            @wraps(view_method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                cache_namespace = namespace(request) if callable(namespace) else namespace
+                key = cache.make_key(request.query_params)
+
+                data = await run_query(lambda: cache.get(cache_namespace, key))
+                if data is not None:
+                    return Response(data, status=status.HTTP_200_OK)
+
+                response = await view_method(view, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    dependencies = depends_on(response.data) if depends_on else ()
+                    await run_query(lambda: cache.set(cache_namespace, key, response.data, timeout, dependencies))
+                return response
+
+            return async_wrapper
+
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            cache_namespace = namespace(request) if callable(namespace) else namespace
+            key = cache.make_key(request.query_params)
+
+            data = cache.get(cache_namespace, key)
+            if data is not None:
+                return Response(data, status=status.HTTP_200_OK)
+
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                dependencies = depends_on(response.data) if depends_on else ()
+                cache.set(cache_namespace, key, response.data, timeout, dependencies)
+            return response
+
+        return wrapper
+
+    return decorator
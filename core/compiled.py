@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields, relations, serializers
+from rest_framework.response import Response
+
+from core.async_db import run_query
+
+# Fields whose to_representation() returns a value read from the database unchanged
+IDENTITY = (
+    fields.CharField.to_representation,
+    fields.IntegerField.to_representation,
+    fields.BooleanField.to_representation,
+    fields.ReadOnlyField.to_representation,
+)
+
+
+def _converter(serializer_class, field):
+    # None when the column value is already the representation
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        # `.values()` gives the raw foreign key, which is what the field outputs
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    if isinstance(field, (serializers.BaseSerializer, relations.RelatedField, relations.ManyRelatedField,
+                          fields.SerializerMethodField)) or field.source == '*' or '.' in field.source:
+        raise ImproperlyConfigured(
+            f"{serializer_class.__name__}.{field.field_name} is not a plain column and can't be compiled"
+        )
+    if isinstance(field, fields.JSONField) and not field.binary:
+        return None
+    if type(field).to_representation in IDENTITY:
+        return None
+    return field.to_representation
+
+
+class CompiledSerializer:
+    """
+    Read-only form of a flat ModelSerializer that serialises `.values()` rows.
+
+    The fields are inspected once, so a row costs a dict lookup per field and
+    a call only for the fields that format their value (Decimal, dates,
+    floats...). The output has the serializer's keys, order and values.
+    Nested serializers, method fields and dotted sources can't be compiled.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        readable = [field for field in serializer_class().fields.values() if not field.write_only]
+        self.plan = [(field.field_name, field.source, _converter(serializer_class, field)) for field in readable]
+        self.columns = tuple(dict.fromkeys(source for _, source, _ in self.plan))
+
+    def values(self, queryset):
+        # Annotations are kept so pagination can still order and cut on them, such as search_rank
+        return queryset.values(*self.columns, *queryset.query.annotation_select)
+
+    def to_representation(self, row):
+        data = {}
+        for name, column, convert in self.plan:
+            value = row[column]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    return CompiledSerializer(serializer_class)
+
+
+class CompiledListMixin:
+    """
+    `list()` for generic list views that skips model instances: the page is
+    read with `.values()` and serialised by the compiled `serializer_class`.
+    """
+
+    def get_compiled_serializer(self):
+        return compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if isinstance(queryset, Response):
+            # Some list views answer a missing parameter from get_queryset
+            return queryset
+
+        compiled = self.get_compiled_serializer()
+        rows = compiled.values(self.filter_queryset(queryset))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page))
+        return Response(compiled.serialize(rows))
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if isinstance(queryset, Response):
+            return queryset
+
+        compiled = self.get_compiled_serializer()
+        rows = compiled.values(self.filter_queryset(queryset))
+        page = await run_query(lambda: self.paginate_queryset(rows))
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page))
+        return Response(compiled.serialize(await run_query(lambda: list(rows))))
@@ -0,0 +1,71 @@
+import hashlib
+import inspect
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+from core.async_db import run_query
+
+
+def _validators(request, state):
+    last_modified = state.pop('last_modified', None)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    # The ETag covers the query string so every page or filter has its own validator
+    fingerprint = f"{request.get_full_path()}|{last_modified}|{sorted(state.items())}"
+    etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+    return etag, timestamp
+
+
+def _add_validators(response, etag, timestamp):
+    if response.status_code == status.HTTP_200_OK:
+        response.headers['ETag'] = etag
+        if timestamp is not None:
+            response.headers['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def conditional_response(validator):
+    """
+    Answers conditional GETs of an API view with 304 Not Modified.
+
+    `validator(request)` returns a dict with a `last_modified` datetime and
+    any other values that identify the current data (such as a row count),
+    or None to skip the check. It should be a cheap aggregate query, so an
+    unchanged payload is never serialised. Async view methods are supported;
+    the validator then runs through run_query.
+    """
+
+    def decorator(view_method):
+        if inspect.iscoroutinefunction(view_method):
+            @wraps(view_method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                state = await run_query(lambda: validator(request))
+                if state is None:
+                    return await view_method(view, request, *args, **kwargs)
+
+                etag, timestamp = _validators(request, state)
+                response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+                if response is not None:
+                    return response
+                return _add_validators(await view_method(view, request, *args, **kwargs), etag, timestamp)
+
+            return async_wrapper
+
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            state = validator(request)
+            if state is None:
+                return view_method(view, request, *args, **kwargs)
+
+            etag, timestamp = _validators(request, state)
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is not None:
+                return response
+            return _add_validators(view_method(view, request, *args, **kwargs), etag, timestamp)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,140 @@
+import logging
+from collections.abc import Mapping
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import SAFE_METHODS
+
+from core.cache import is_shared_cache
+
+logger = logging.getLogger(__name__)
+
+REPLICA = 'replica'
+
+# How the endpoints name the user they act for: add-order and add-address send `user` in the body,
+# add-rating sends `userId`, and the address and review endpoints take the `user_id` query parameter
+USER_ID_FIELDS = ('user', 'userId', 'user_id')
+USER_ID_PARAM = 'user_id'
+
+# The alias reads go to while a replica-safe view handles a request; None means the primary
+read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def sticky_key(user_id):
+    return f'primary-sticky:{user_id}'
+
+
+def request_user_ids(request, data=None):
+    """The ids of the user a DRF request acts for: the token user and the user ids in its query or `data`."""
+    user_ids = set()
+    if request.user and request.user.is_authenticated:
+        user_ids.add(str(request.user.pk))
+    if request.query_params.get(USER_ID_PARAM):
+        user_ids.add(request.query_params[USER_ID_PARAM])
+    if isinstance(data, Mapping):
+        user_ids.update(str(data[field]) for field in USER_ID_FIELDS
+                        if isinstance(data.get(field), (str, int)) and data[field] != '')
+    return user_ids
+
+
+def is_sticky(request):
+    # Someone who just wrote reads from the primary, so they see their own change even if the replica lags
+    user_ids = request_user_ids(request)
+    return bool(user_ids) and any(cache.get_many([sticky_key(user_id) for user_id in user_ids]).values())
+
+
+def mark_sticky(user_ids):
+    cache.set_many({sticky_key(user_id): True for user_id in user_ids}, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only inside views using ReplicaReadMixin.
+
+    Everything else, including every write and the reads of write flows
+    (checkout, order detail, address updates), stays on `default`.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary through replication
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """
+    For read-only catalogue and review lists, which can tolerate a few seconds of replication lag.
+
+    The choice is made after DRF authenticates the request, because token
+    users are only known at that point. Requests that name a user with the
+    `user_id` query parameter are matched to that user's writes as well.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.reads_from_replica = (
+            request.method in SAFE_METHODS and replica_configured() and not is_sticky(request)
+        )
+        if self.reads_from_replica:
+            read_alias.set(REPLICA)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Not a token reset: async views run initial() in a thread, whose context is copied back by value
+        if getattr(self, 'reads_from_replica', False):
+            read_alias.set(None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class StickyPrimaryMiddleware:
+    """
+    Starts the read-from-primary window after every successful write request.
+
+    The window covers the token user and the user ids the write names (see
+    request_user_ids), and it is kept in the default cache, which must be
+    shared by the workers: a per-process cache would only keep the user on
+    the primary while they hit the worker that handled their write. That is
+    refused in production and only warned about with DEBUG on, where the
+    single runserver process sees its own cache.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        if not is_shared_cache():
+            message = ("A read replica needs a shared default cache (set REDIS_URL) to keep users on the primary "
+                       "after a write")
+            if not settings.DEBUG:
+                raise ImproperlyConfigured(message)
+            logger.warning("%s; with a per-process cache only the worker that handled a write knows of it", message)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+
+        # DRF keeps its request, with the authenticated user and the parsed body, in the renderer context
+        drf_request = (getattr(response, 'renderer_context', None) or {}).get('request')
+        if drf_request is not None:
+            try:
+                data = drf_request.data
+            except ParseError:
+                data = None
+            mark_sticky(request_user_ids(drf_request, data))
+        return response
@@ -0,0 +1,97 @@
+from functools import cached_property
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _names(request, param):
+    # A comma separated list, None when the parameter isn't given
+    if param not in request.query_params:
+        return None
+    return [name.strip() for name in request.query_params[param].split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin for sparse fieldsets (`?fields=` and `?expand=`).
+
+    When a request sends either parameter, `fields` picks the plain fields
+    (all of them when it is left out) and the nested relations listed in
+    `Meta.expandable_fields` are output only when named in `expand`. A
+    request without them gets the full serializer, as before. The view
+    passes the resulting `fieldset` both to the serializer and to
+    `setup_eager_loading`, which loads only those columns and relations.
+    """
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fieldset is not None:
+            for name in list(self.fields):
+                if name not in fieldset:
+                    self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """The field names to output in declaration order, or None for the full serializer."""
+        if fields is None and expand is None:
+            return None
+
+        declared = list(cls().fields)
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        plain = [name for name in declared if name not in expandable]
+
+        errors = {}
+        unknown = [name for name in fields or () if name not in plain]
+        if unknown:
+            errors[FIELDS_PARAM] = [
+                f"'{name}' is a relation, request it with {EXPAND_PARAM}." if name in expandable
+                else f"'{name}' is not a field." for name in unknown
+            ]
+        unknown = [name for name in expand or () if name not in expandable]
+        if unknown:
+            errors[EXPAND_PARAM] = [f"'{name}' cannot be expanded." for name in unknown]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        selected = set(plain if fields is None else fields) | set(expand or ())
+        return [name for name in declared if name in selected]
+
+    @classmethod
+    def fieldset_from_request(cls, request):
+        return cls.select_fields(_names(request, FIELDS_PARAM), _names(request, EXPAND_PARAM))
+
+    @classmethod
+    def only_columns(cls, fieldset, required=()):
+        """
+        The model fields behind `fieldset`, for `.only()`.
+
+        `required` adds the fields the view needs besides the output, such as
+        the ordering of its keyset pagination ('-' prefixes are ignored).
+        """
+        model = cls.Meta.model
+        serializer_fields = cls().fields
+        columns = [model._meta.pk.name, *(name.lstrip('-') for name in required)]
+        for name in fieldset:
+            try:
+                model_field = model._meta.get_field(serializer_fields[name].source.split('.')[0])
+            except FieldDoesNotExist:
+                # Method fields, properties and reverse relations have no column
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.append(model_field.name)
+        return list(dict.fromkeys(columns))
+
+
+class SparseFieldsViewMixin:
+    """Generic views: reads the fieldset of the request and hands it to the serializer."""
+
+    @cached_property
+    def fieldset(self):
+        return self.get_serializer_class().fieldset_from_request(self.request)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fieldset', self.fieldset)
+        return super().get_serializer(*args, **kwargs)
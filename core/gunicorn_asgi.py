@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for the ASGI deployment.
+
+    gunicorn -c core/gunicorn_asgi.py core.asgi:application
+
+Each uvicorn worker runs an event loop, so a request waiting on the database
+doesn't hold the worker, and the read endpoints are served by their async
+views. The WSGI command in the Dockerfile keeps working unchanged.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8800')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn.workers.UvicornWorker'
+timeout = 30
+keepalive = 5
+
+raw_env = [
+    # Route the catalogue and review reads to the async views in every worker
+    'ASYNC_READ_VIEWS=True',
+    # Under ASGI each request runs its sync code on a thread of its own, so persistent connections would pile up.
+    # The async views keep theirs open on the shared threads of core.async_db instead, for ASYNC_DB_CONN_MAX_AGE.
+    'CONN_MAX_AGE=0',
+]
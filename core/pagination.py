@@ -0,0 +1,126 @@
+import json
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination with a page-number compatibility mode.
+
+    Pages are fetched with `WHERE key < last_seen ORDER BY key, id LIMIT n`, so
+    neither a COUNT(*) nor an OFFSET is needed however deep the client scrolls.
+    Clients opt in by sending `cursor` (empty for the first page) and then
+    following the `next` links. Requests without `cursor` keep the old
+    PageNumberPagination payload, or the old unpaginated list when
+    `legacy_page_numbers` is off, so existing clients still work.
+
+    Unlike CursorPagination, the cursor holds every column of the ordering, so
+    rows tied on the first column are told apart by the rest of the key
+    instead of by an offset. Orderings should end with a unique column.
+    """
+
+    page_size = 20  # Number of items per page by default
+    page_size_query_param = 'page_size'
+    max_page_size = 100  # Optional, if you want to limit the maximum page size
+    ordering = ('-created_at', '-id')
+    legacy_page_numbers = True
+    legacy_paginator = None
+
+    def use_cursor(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def get_legacy_paginator(self):
+        paginator = PageNumberPagination()
+        paginator.page_size = self.page_size
+        paginator.page_size_query_param = self.page_size_query_param
+        paginator.max_page_size = self.max_page_size
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy_paginator = None
+        if self.use_cursor(request):
+            return self.paginate_cursor(queryset, request, view)
+
+        if not self.legacy_page_numbers:
+            return None
+
+        # Offset pages still get the same stable ordering
+        self.legacy_paginator = self.get_legacy_paginator()
+        ordering = self.get_ordering(request, queryset, view)
+        return self.legacy_paginator.paginate_queryset(queryset.order_by(*ordering), request, view)
+
+    def paginate_cursor(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset, seeking past the whole ordering key rather than its first column
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(ordering, position))
+
+        # One extra row tells whether a page follows this one
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        moved = position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = moved, following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next, self.has_previous = following is not None, moved
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def seek(self, ordering, position):
+        """The rows after `position` in `ordering`: (a, b) > (x, y) is a > x OR (a = x AND b > y)."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        branches, equal = [], Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            lookup = '__lt' if order.startswith('-') else '__gt'
+            branches.append(equal & Q(**{field + lookup: value}))
+            equal &= Q(**{field: value})
+        return reduce(operator.or_, branches)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            values.append(str(instance[field] if isinstance(instance, dict) else getattr(instance, field)))
+        return json.dumps(values, separators=(',', ':'))
+
+    def decode_cursor(self, request):
+        # An empty cursor asks for the first page in cursor mode
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+    def get_paginated_response(self, data):
+        if self.legacy_paginator is not None:
+            return self.legacy_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
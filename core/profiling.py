@@ -0,0 +1,146 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings and SQL statements collected while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_ms = 0.0
+        self.serializer_ms = 0.0
+        self.render_ms = 0.0
+        self.render_started = None
+        self.serializing = False
+        self.statements = Counter()
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            # Parameters are left out, so an N+1 loop shows up as one statement run many times
+            self.statements[sql] += 1
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        if self.render_started is not None:
+            self.render_ms += (time.perf_counter() - self.render_started) * 1000
+
+    def duplicates(self):
+        return [{'sql': sql, 'count': count} for sql, count in self.statements.most_common() if count > 1]
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serializer_ms:.1f}',
+            f'render;dur={self.render_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+
+def _timed_data(data_property):
+    getter = data_property.fget
+
+    @wraps(getter)
+    def data(serializer):
+        profile = current_profile.get()
+        # Nested serializers are part of the outermost one's time
+        if profile is None or profile.serializing:
+            return getter(serializer)
+
+        profile.serializing = True
+        start = time.perf_counter()
+        try:
+            return getter(serializer)
+        finally:
+            profile.serializer_ms += (time.perf_counter() - start) * 1000
+            profile.serializing = False
+
+    data.profiled = True
+    return property(data)
+
+
+def instrument_serializers():
+    # Time `.data`, where DRF turns model instances into primitives (and where lazy relations hit the database)
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(serializer_class.data.fget, 'profiled', False):
+            serializer_class.data = _timed_data(serializer_class.data)
+
+
+class RequestProfilingMiddleware:
+    """
+    Adds a Server-Timing header with database, serializer, render and total time.
+
+    Enabled with the REQUEST_PROFILING setting. Requests slower than
+    REQUEST_PROFILING_SLOW_MS, or running one statement at least
+    REQUEST_PROFILING_DUPLICATES times, are logged as a JSON record listing
+    the repeated SQL so N+1 patterns can be found from production logs.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        self.duplicate_threshold = getattr(settings, 'REQUEST_PROFILING_DUPLICATES', 10)
+        instrument_serializers()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        response.headers['Server-Timing'] = profile.server_timing(total_ms)
+
+        duplicates = profile.duplicates()
+        if total_ms >= self.slow_ms or (duplicates and duplicates[0]['count'] >= self.duplicate_threshold):
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'db_ms': round(profile.db_ms, 1),
+                'serializer_ms': round(profile.serializer_ms, 1),
+                'render_ms': round(profile.render_ms, 1),
+                'queries': profile.queries,
+                'duplicates': duplicates[:10],
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        profile = current_profile.get()
+        if profile is not None:
+            profile.start_render()
+            response.add_post_render_callback(profile.finish_render)
+        return response
@@ -0,0 +1,62 @@
+import math
+
+import orjson
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+# orjson handles str, int, float, bool, None, dicts, lists and tuples natively. Dates and times are passed
+# through so they get DRF's formatting (milliseconds, 'Z' for UTC) from the same encoder as before.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+def has_non_finite_float(data):
+    # orjson writes NaN and infinities as null, which the stdlib renderer refuses to do
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson.
+
+    The output is byte-identical to the stdlib renderer for compact UTF-8
+    JSON, which is what the API serves. Anything orjson has no native
+    encoding for (Decimal, datetime, lazy strings, querysets...) goes
+    through DRF's JSONEncoder. Indented output (the browsable API), ASCII
+    output and payloads orjson rejects, such as integers above 64 bits,
+    use the stdlib renderer, and so do payloads holding NaN or an infinity,
+    which the strict renderer refuses. One difference remains: floats under
+    1e-4 or from 1e16 up are written in an equivalent notation (0.00001 for
+    1e-05).
+    """
+
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if not self.compact or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Let the stdlib renderer encode it or raise its usual error
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and has_non_finite_float(data):
+            # Only output with a null can hide one, so payloads without any skip the walk
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # The same escaping as JSONRenderer, so the output stays valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # djoser's logout deletes the token through a queryset, which still sends post_delete for each row
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    # The cached token carries a copy of the user, so any change (deactivation, staff flag) drops it.
+    # Logins only move last_login, which authentication doesn't look at.
+    if not created and update_fields != frozenset({'last_login'}):
+        for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+            invalidate_token(key)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('address', '0002_address_created_at_address_updated_at'),
+        ('orders', '0010_rename_product_id_orderitem_product_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_status', 'payment_status', 'created_at'], name='order_history_idx'),
+        ),
+    ]
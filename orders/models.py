@@ -38,6 +38,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Serves the order history filters and its newest-first ordering
+            models.Index(fields=['user', 'order_status', 'payment_status', 'created_at'], name='order_history_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user} delivering to {self.address.address}"
 
@@ -1,8 +1,11 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from address.serializers import AddressSerializer
+from core.fieldsets import SparseFieldsMixin
 from orders.models import OrderItem, Order
-from stores.models import StoreOrder
+from products.models import Product, Variation, Accessory
+from stores.models import Store, StoreOrder
 from stores.serializers import StoreBasicSerializer
 from products.serializers import ProductPartialSerializer, VariationSerializer, AccessorySerializer
 
@@ -22,10 +25,76 @@ class OrderItemSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderItemBulkCreateListSerializer(serializers.ListSerializer):
+    # Related field name -> model used to resolve the submitted IDs
+    related_models = {
+        'product': Product,
+        'store': Store,
+        'variation_ref': Variation,
+        'accessory_ref': Accessory,
+    }
+
+    def validate(self, attrs):
+        # Resolve every foreign key of the basket with a single in_bulk per model
+        errors = [{} for _ in attrs]
+        for field_name, model in self.related_models.items():
+            ids = {item[field_name] for item in attrs if item.get(field_name) is not None}
+            instances = model.objects.in_bulk(ids)
+
+            for index, item in enumerate(attrs):
+                related_id = item.get(field_name)
+                if related_id is None:
+                    continue
+                if related_id not in instances:
+                    errors[index][field_name] = [f'Invalid pk "{related_id}" - object does not exist.']
+                else:
+                    item[field_name] = instances[related_id]
+
+        if any(errors):
+            raise serializers.ValidationError({'order_items': errors})
+        return attrs
+
+    def create(self, validated_data):
+        return OrderItem.objects.bulk_create([OrderItem(**item) for item in validated_data])
+
+
+class OrderItemCreateSerializer(serializers.ModelSerializer):
+    # Plain IDs here; they are resolved in bulk by the list serializer
+    product = serializers.IntegerField()
+    store = serializers.IntegerField()
+    variation_ref = serializers.IntegerField(required=False, allow_null=True)
+    accessory_ref = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = OrderItem
+        list_serializer_class = OrderItemBulkCreateListSerializer
+        fields = [
+            'product', 'user_id', 'store', 'quantity', 'price',
+            'variation_ref', 'accessory_ref', 'color',
+        ]
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     store = StoreBasicSerializer(read_only=True)
 
+    @staticmethod
+    def order_items_prefetch():
+        # Load the items with their product, store, variation and accessory in one query
+        return Prefetch(
+            'order_items',
+            queryset=OrderItem.objects.select_related('product', 'store', 'variation_ref', 'accessory_ref')
+        )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None, required=()):
+        # With a fieldset, only its columns are read and the items only loaded when expanded
+        if fieldset is not None:
+            queryset = queryset.only(*cls.only_columns(fieldset, required))
+            if 'order_items' not in fieldset:
+                return queryset
+        return queryset.prefetch_related(cls.order_items_prefetch())
+
     class Meta:
         model = Order
         fields = [
@@ -33,13 +102,28 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'delivery_price', 'payment_method',
             'payment_status', 'address', 'rated_products'
         ]
+        expandable_fields = ['order_items']
 
 
-class StoreOrderSerializer(serializers.ModelSerializer):
+class StoreOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)  # Nested OrderItem serializer
     address = AddressSerializer(read_only=True)  # Nested Address serializer
 
     class Meta:
         model = StoreOrder
         fields = ['id', 'store_reference', 'order_reference', 'order_items', 'address', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+        expandable_fields = ['order_items', 'address']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None, required=()):
+        if fieldset is None:
+            return queryset.select_related('address').prefetch_related(OrderSerializer.order_items_prefetch())
+
+        # The rollup signals read order_status as soon as a store order is loaded (stores/signals.py)
+        queryset = queryset.only(*cls.only_columns(fieldset, ['order_status', *required]))
+        if 'address' in fieldset:
+            queryset = queryset.select_related('address')
+        if 'order_items' in fieldset:
+            queryset = queryset.prefetch_related(OrderSerializer.order_items_prefetch())
+        return queryset
\ No newline at end of file
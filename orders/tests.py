@@ -1,3 +1,123 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from orders.models import Order, OrderItem
+from products.models import Brand, Category, Product
+from products.tests import make_product, make_store
+from stores.models import StoreOrder
+
+
+class OrderTestCase(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title='Phones', imageUrl='https://example.com/phones.png')
+        brand = Brand.objects.create(title='Acme', imageUrl='https://example.com/acme.png')
+        self.stores = [make_store(title='First'), make_store(title='Second')]
+        self.products = [make_product(store, category, brand, title=f'{store.title} {index}', stock=50)
+                         for store in self.stores for index in range(3)]
+
+    def add_order(self, products, quantity=1):
+        items = [{'product': product.id, 'store': product.store_ref_id, 'user_id': '7', 'quantity': quantity,
+                  'price': '100.00', 'color': 'black'} for product in products]
+        return self.client.post('/api/orders/add-order', {
+            'user': '7', 'total_price': '300.00', 'delivery_price': '10.00', 'order_items': items,
+        }, content_type='application/json')
+
+
+class OrderCreateTests(OrderTestCase):
+    def test_query_count_does_not_grow_with_the_basket(self):
+        # One product from each store, then every product of both stores
+        small = [self.products[0], self.products[3]]
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.add_order(small).status_code, 201)
+        with CaptureQueriesContext(connection) as many:
+            response = self.add_order(self.products)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(many), len(few))
+
+        order = Order.objects.get(id=response.json()['id'])
+        self.assertEqual(len(response.json()['order_items']), 6)
+        store_orders = StoreOrder.objects.filter(order_reference=order.id)
+        self.assertCountEqual([store_order.store_reference for store_order in store_orders],
+                              [store.id for store in self.stores])
+        for store_order in store_orders:
+            self.assertEqual({item.store_id for item in store_order.order_items.all()}, {store_order.store_reference})
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 48)
+
+    def test_invalid_items_write_nothing(self):
+        items = [self.products[0], Product(id=10 ** 6, store_ref_id=self.stores[0].id)]
+        response = self.add_order(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('product', response.json()['order_items'][1])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 50)
+
+    def test_out_of_stock_baskets_are_refused(self):
+        response = self.add_order(self.products[:2], quantity=60)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.json()['unavailable']), 2)
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class OrderListTests(OrderTestCase):
+    def history(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/user-orders', {'user_id': '7', 'order_status': 'pending', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_orders_and_items(self):
+        self.add_order(self.products[:1])
+        _, few = self.history()
+
+        for _ in range(3):
+            self.add_order(self.products)
+        page, many = self.history()
+
+        self.assertEqual(many, few)
+        self.assertEqual(page['count'], 4)
+        items = page['results'][0]['order_items']
+        self.assertEqual(len(items), 6)
+        self.assertEqual(items[0]['product_data']['id'], self.products[0].id)
+        self.assertEqual(items[0]['store_data']['id'], self.stores[0].id)
+
+    def test_other_users_and_statuses_are_left_out(self):
+        self.add_order(self.products[:1])
+        Order.objects.update(user='8')
+        self.add_order(self.products[:1])
+        Order.objects.filter(user='7').update(order_status='shipped')
+        self.add_order(self.products[:1])
+
+        page, _ = self.history()
+        self.assertEqual(page['count'], 1)
+        self.assertEqual(self.client.get('/api/orders/user-orders', {'user_id': '7', 'order_status': 'lost'}).status_code,
+                         400)
+
+    def test_sparse_fieldset(self):
+        self.add_order(self.products)
+        _, full = self.history()
+
+        page, sparse = self.history(fields='total_price,id')
+        self.assertEqual(list(page['results'][0]), ['id', 'total_price'])
+        self.assertLess(sparse, full)
+
+        page, _ = self.history(fields='id', expand='order_items')
+        self.assertEqual(list(page['results'][0]), ['id', 'order_items'])
+        self.assertEqual(len(page['results'][0]['order_items']), 6)
+
+        order_id = page['results'][0]['id']
+        response = self.client.get('/api/orders/order', {'order_id': order_id, 'fields': 'order_status'})
+        self.assertEqual(response.json(), {'order_status': 'pending'})
+        response = self.client.get('/api/orders/order', {'order_id': order_id, 'fields': 'order_items'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pages_break_created_at_ties_by_id(self):
+        orders = [Order.objects.create(user='7', total_price=100, delivery_price=10) for _ in range(5)]
+        Order.objects.update(created_at=orders[0].created_at)
+
+        page, _ = self.history(cursor='', page_size=2)
+        seen = [order['id'] for order in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen += [order['id'] for order in page['results']]
+        self.assertEqual(seen, [order.id for order in reversed(orders)])
@@ -1,20 +1,22 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.views.generic import ListView
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.pagination import KeysetPagination
 from orders.models import Order
-from orders.serializers import OrderSerializer, OrderItemSerializer
-from stores.models import Store, StoreOrder
+from orders.serializers import OrderSerializer, OrderItemCreateSerializer
+from products.stock import InsufficientStock, reserve
+from stores.models import StoreOrder
+from stores.rollups import record_store_orders
 
 
 # Create your views here.
-class OrdersPagination(PageNumberPagination):
+class OrdersPagination(KeysetPagination):
     page_size = 20  # Number of items per page by default
-    page_size_query_param = 'page_size'
-    max_page_size = 100  # Optional, if you want to limit the maximum page size
+    ordering = ('-created_at', '-id')
 
 
 class OrderListView(APIView):
@@ -46,19 +48,22 @@ class OrderListView(APIView):
         if order_status not in ['confirmed', 'shipped', 'delivered', 'failed', 'pending']:
             return Response({"message": "Order status is invalid"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter the orders based on the provided filters
-        queryset = Order.objects.filter(**filters)
+        # Filter the orders based on the provided filters, loading their items up front unless the fieldset leaves
+        # them out. The keyset pagination cuts on its ordering columns, so those are always loaded.
+        fieldset = OrderSerializer.fieldset_from_request(request)
+        queryset = OrderSerializer.setup_eager_loading(Order.objects.filter(**filters), fieldset,
+                                                       self.pagination_class.ordering)
 
         # Apply pagination
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         
         if page is not None:
-            serializer = self.serializer_class(page, many=True)
+            serializer = self.serializer_class(page, many=True, fieldset=fieldset)
             return paginator.get_paginated_response(serializer.data)
 
         # If no pagination is applied (e.g., when queryset is small)
-        serializer = self.serializer_class(queryset, many=True)
+        serializer = self.serializer_class(queryset, many=True, fieldset=fieldset)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -71,12 +76,13 @@ class OrderDetailView(APIView):
         if not order_id:
             return Response({"message": "Order id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
+        fieldset = OrderSerializer.fieldset_from_request(request)
         try:
-            order = Order.objects.get(id=order_id)
+            order = OrderSerializer.setup_eager_loading(Order.objects.all(), fieldset).get(id=order_id)
         except Order.DoesNotExist:
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = OrderSerializer(order)
+        serializer = OrderSerializer(order, fieldset=fieldset)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -89,56 +95,51 @@ class OrderCreateView(APIView):
         order_data = request.data.copy()
         order_items_data = order_data.pop('order_items', [])
 
-        # Placeholder for created order item instances
-        created_order_items = []
-        store_order_items = {}
-
-        # Create the Order instance first
+        # Validate the order and every order item before writing anything
         order_serializer = OrderSerializer(data=order_data)
-        if order_serializer.is_valid():
-            # Save the Order and get the instance
-            order = order_serializer.save()
-
-            # Create the OrderItem instances and assign them to the Order
-            for item_data in order_items_data:
-                # Add the order reference to each order item
-                item_data['reference'] = order.id
-
-                # Serialize and validate the OrderItem data
-                order_item_serializer = OrderItemSerializer(data=item_data)
-                if order_item_serializer.is_valid():
-                    # Save the OrderItem and append it to the list of created items
-                    order_item = order_item_serializer.save()
-                    created_order_items.append(order_item)
-
-                    # Organize order items by store for creating StoreOrder later
-                    store_id = order_item.store.id
-                    if store_id in store_order_items:
-                        store_order_items[store_id].append(order_item)
-                    else:
-                        store_order_items[store_id] = [order_item]
-
-                else:
-                    # If any OrderItem is invalid, return the error
-                    return Response(order_item_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            # Now create StoreOrder for each store and link the relevant order items
-            for store_id, items in store_order_items.items():
-                store_instance = Store.objects.get(id=store_id)
-
-                # Check if all items belong to the same store, then create StoreOrder
-                if all(item.store.id == store_id for item in items):
-                    store_order = StoreOrder.objects.create(
-                        store_reference=store_instance.id,
-                        order_reference=order.id,
-                        address=order.address
-                    )
-                    # Link order items to the store order
-                    store_order.order_items.add(*items)
-                    store_order.save()
-
-            # Return the response with the created order data
-            return Response(order_serializer.data, status=status.HTTP_201_CREATED)
-
-        # If the Order is invalid, return the error
-        return Response(order_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not order_serializer.is_valid():
+            return Response(order_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        order_items_serializer = OrderItemCreateSerializer(data=order_items_data, many=True)
+        if not order_items_serializer.is_valid():
+            return Response(order_items_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Take the basket out of stock; nothing is written when any line cannot be fulfilled
+        try:
+            reserve([
+                (item['product'].id, item['variation_ref'].id if item.get('variation_ref') else None, item['quantity'])
+                for item in order_items_serializer.validated_data
+            ])
+        except InsufficientStock as exc:
+            return Response({"message": "Some items are out of stock", "unavailable": exc.unavailable},
+                            status=status.HTTP_409_CONFLICT)
+
+        # Save the Order, then insert all of its items at once
+        order = order_serializer.save()
+        order_items = order_items_serializer.save(reference=order)
+
+        # Organize order items by store for creating StoreOrder later
+        store_order_items = {}
+        for order_item in order_items:
+            store_order_items.setdefault(order_item.store_id, []).append(order_item)
+
+        # Create one StoreOrder per store and link the relevant order items
+        store_orders = StoreOrder.objects.bulk_create([
+            StoreOrder(store_reference=store_id, order_reference=order.id, address_id=order.address_id)
+            for store_id in store_order_items
+        ])
+        StoreOrderItem = StoreOrder.order_items.through
+        StoreOrderItem.objects.bulk_create([
+            StoreOrderItem(storeorder_id=store_order.id, orderitem_id=order_item.id)
+            for store_order, items in zip(store_orders, store_order_items.values())
+            for order_item in items
+        ])
+
+        # Bulk inserts skip the model signals, so update the store sales rollups directly
+        record_store_orders(list(zip(store_orders, store_order_items.values())))
+
+        # Load the created items with their relations in one query for the response
+        prefetch_related_objects([order], OrderSerializer.order_items_prefetch())
+
+        # Return the response with the created order data
+        return Response(order_serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,49 @@
+from django.http import QueryDict
+
+from core.cache import TieredCache
+
+catalogue_cache = TieredCache('catalogue', max_entries=2048)
+
+# Cache namespaces of the catalogue read endpoints
+HOME_CATEGORIES = 'home_categories'
+CATEGORIES = 'categories'
+BRANDS = 'brands'
+DISCOUNTS = 'discounts'
+CATEGORY_PRODUCTS = 'category_products'
+BRAND_PRODUCTS = 'brand_products'
+FACETS = 'facets'
+
+
+SINGLE_PRODUCT_TIMEOUT = 5 * 60
+
+
+def single_product_namespace(product_id):
+    return f"singles:{product_id}"
+
+
+def store_namespace(store_id):
+    # Product payloads nest their store, so they depend on this namespace
+    return f"store:{store_id}"
+
+
+def single_product_dependencies(data):
+    # Sparse payloads without the store don't depend on it
+    store = data.get('store_ref')
+    return [store_namespace(store['id'])] if isinstance(store, dict) else []
+
+
+def requested_product_id(request):
+    """`?product_id=` as an int, None when it is missing or not an integer."""
+    try:
+        return int(request.query_params.get('product_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def single_product_key(product_id):
+    # The key of the full payload GetProductById caches for `?product_id=`, which the batch endpoint shares
+    return catalogue_cache.make_key(QueryDict(f'product_id={product_id}'))
+
+
+# Product list endpoints that have to be dropped whenever any product changes
+PRODUCT_LIST_NAMESPACES = (DISCOUNTS, CATEGORY_PRODUCTS, BRAND_PRODUCTS, FACETS)
@@ -0,0 +1,166 @@
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, Max, Min, Q, Value
+from django.db.models.functions import Floor, Least
+
+from products.models import Product, ProductFacetValue
+from products.search import get_search_backend
+from products.similarity import PRICE_BANDS
+
+# Free-text fields whose comma separated values are offered as facets
+TOKEN_FIELDS = ('color', 'capacity')
+HISTOGRAM_BINS = 10
+MAX_FACET_VALUES = 50
+
+
+def token_filter(field, value):
+    # Match one comma separated entry of a free-text list field, case-insensitively, through its facet rows
+    products = ProductFacetValue.objects.filter(field=field, value=value.strip().lower()).values('product')
+    return Q(id__in=products)
+
+
+def split_tokens(value):
+    return [token.strip().lower() for token in (value or '').split(',') if token.strip()]
+
+
+def index_facets(products, replace=True):
+    """
+    Store the entries of the products' color and capacity lists as ProductFacetValue rows.
+
+    Saving a product goes through the post_save signal; bulk inserts call
+    this directly, with replace=False for products that have no rows yet.
+    """
+    if replace:
+        ProductFacetValue.objects.filter(product__in=[product.id for product in products]).delete()
+    ProductFacetValue.objects.bulk_create([
+        ProductFacetValue(product_id=product.id, field=field, value=value)
+        for product in products for field in TOKEN_FIELDS
+        for value in dict.fromkeys(split_tokens(getattr(product, field)))
+    ])
+
+
+def normalise_filters(params):
+    """
+    Keep the supported filters of a query string in a canonical form.
+
+    Invalid and non-finite numbers are dropped and text values are trimmed
+    and lowercased, so equivalent requests share a cache entry.
+    """
+    filters = {}
+    for key in ('min_price', 'max_price'):
+        try:
+            value = Decimal(params.get(key, ''))
+        except (InvalidOperation, ValueError):
+            continue
+        # NaN and infinities parse as decimals but can't be compared with prices
+        if value.is_finite():
+            filters[key] = str(value.normalize())
+    for key in ('category', 'brand'):
+        try:
+            filters[key] = int(params.get(key, ''))
+        except ValueError:
+            pass
+    for key in ('title', 'condition', *TOKEN_FIELDS):
+        value = ' '.join((params.get(key) or '').split()).lower()
+        if value:
+            filters[key] = value
+    return filters
+
+
+def facets_cache_key(filters):
+    return hashlib.md5(repr(sorted(filters.items())).encode()).hexdigest()
+
+
+def _conditions(filters, exclude=()):
+    conditions = Q()
+    if 'min_price' in filters and 'price' not in exclude:
+        conditions &= Q(price__gte=Decimal(filters['min_price']))
+    if 'max_price' in filters and 'price' not in exclude:
+        conditions &= Q(price__lte=Decimal(filters['max_price']))
+    for key in ('category', 'brand', 'condition'):
+        if key in filters and key not in exclude:
+            conditions &= Q(**{key: filters[key]})
+    for key in TOKEN_FIELDS:
+        if key in filters and key not in exclude:
+            conditions &= token_filter(key, filters[key])
+    return conditions
+
+
+def _price_buckets(queryset):
+    bounds = [0, *PRICE_BANDS, None]
+    aggregates = {'min_price': Min('price'), 'max_price': Max('price')}
+    for index, (low, high) in enumerate(zip(bounds, bounds[1:])):
+        condition = Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+
+    # Every band and the price range come from one aggregate query
+    row = queryset.aggregate(**aggregates)
+    buckets = [
+        {'min': low, 'max': high, 'count': row[f'bucket_{index}']}
+        for index, (low, high) in enumerate(zip(bounds, bounds[1:]))
+    ]
+    return buckets, row['min_price'], row['max_price']
+
+
+def _histogram(queryset, min_price, max_price):
+    if min_price is None:
+        return []
+
+    # SQLite returns the aggregates as floats
+    min_price, max_price = Decimal(str(min_price)), Decimal(str(max_price))
+    width = ((max_price - min_price) / HISTOGRAM_BINS).quantize(Decimal('0.01')) or Decimal(1)
+    position = ExpressionWrapper((F('price') - Value(min_price)) / Value(width), output_field=DecimalField())
+    counts = dict(
+        queryset.annotate(bin=Least(Floor(position), Value(HISTOGRAM_BINS - 1), output_field=IntegerField()))
+        .values_list('bin').annotate(count=Count('id')).order_by().values_list('bin', 'count')
+    )
+    return [
+        {'min': float(min_price + width * index), 'max': float(min_price + width * (index + 1)),
+         'count': counts.get(index, 0)}
+        for index in range(HISTOGRAM_BINS)
+    ]
+
+
+def _grouped(queryset, field):
+    return queryset.order_by().values_list(field).annotate(count=Count('id')).values_list(field, 'count')
+
+
+def _token_counts(queryset, field):
+    # A product has one facet row per distinct value, so it counts once per value
+    rows = ProductFacetValue.objects.filter(field=field, product__in=queryset.values('id'))
+    return dict(_grouped(rows, 'value'))
+
+
+def _ranked(counts):
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+    return [{'value': value, 'count': count} for value, count in ranked[:MAX_FACET_VALUES]]
+
+
+def facet_counts(filters):
+    """
+    Counts per brand, category, condition, color, capacity and price band for a normalised filter set.
+
+    Each facet is counted with every filter except its own, so the filter
+    sheet can show how many products another choice would give. That is one
+    grouped query per facet plus two for the prices, whatever the catalogue size.
+    """
+    queryset = Product.objects.all()
+    if 'title' in filters:
+        # Every match counts, not only the best max_results the ranked search returns
+        queryset = queryset.filter(get_search_backend().match(filters['title']))
+
+    def facet_queryset(key):
+        return queryset.filter(_conditions(filters, exclude=(key,)))
+
+    buckets, min_price, max_price = _price_buckets(facet_queryset('price'))
+    return {
+        'total': queryset.filter(_conditions(filters)).count(),
+        'brand': _ranked(dict(_grouped(facet_queryset('brand'), 'brand'))),
+        'category': _ranked(dict(_grouped(facet_queryset('category'), 'category'))),
+        'condition': _ranked(dict(_grouped(facet_queryset('condition'), 'condition'))),
+        'color': _ranked(_token_counts(facet_queryset('color'), 'color')),
+        'capacity': _ranked(_token_counts(facet_queryset('capacity'), 'capacity')),
+        'price_buckets': buckets,
+        'price_histogram': _histogram(facet_queryset('price'), min_price, max_price),
+    }
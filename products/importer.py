@@ -0,0 +1,228 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from products.cache import catalogue_cache, PRODUCT_LIST_NAMESPACES, single_product_namespace
+from products.facets import index_facets
+from products.models import Accessory, Brand, Category, Product, Variation
+from products.sampling import product_sampler
+from products.search import get_search_backend
+from products.serializers import AccessoryImportSerializer, ProductImportSerializer, VariationImportSerializer
+from products.similarity import similar_products_index
+from stores.models import Store
+
+FORMATS = ('csv', 'jsonl')
+
+# Cells that hold lists; CSV files give them as JSON arrays or `|` separated values
+LIST_FIELDS = ('image_urls', 'reviews')
+
+
+def detect_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (line number, row) pairs from a text stream, one row at a time.
+
+    Rows that cannot be parsed are yielded as None so the importer can
+    report them with the other row errors.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty cells fall back to the model defaults
+            row = {key: value for key, value in row.items() if key and value not in (None, '')}
+            for field in LIST_FIELDS:
+                if isinstance(row.get(field), str):
+                    row[field] = _list_cell(row[field])
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _list_cell(value):
+    value = value.strip()
+    if value.startswith('['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return [item.strip() for item in value.split('|') if item.strip()]
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class CatalogueImporter:
+    """
+    Streams catalogue rows into the database in batches.
+
+    `kind` is one of products, variations or accessories. Categories, brands
+    and stores are looked up in maps loaded once per run, and referenced
+    products once per batch, so validating a row never queries the database.
+    Each batch is saved with a single bulk_create in its own transaction;
+    invalid rows are reported and skipped. `store_ids` limits the stores the
+    rows may belong to (None allows every store).
+    """
+
+    serializers = {
+        'products': ProductImportSerializer,
+        'variations': VariationImportSerializer,
+        'accessories': AccessoryImportSerializer,
+    }
+    models = {'products': Product, 'variations': Variation, 'accessories': Accessory}
+    max_errors = 1000  # Only the first errors are kept so memory stays flat on bad files
+
+    def __init__(self, kind, batch_size=500, store_ids=None):
+        if kind not in self.serializers:
+            raise ValueError(f"Unknown import kind '{kind}'")
+        self.kind = kind
+        self.batch_size = batch_size
+        self.store_ids = store_ids
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        if self.kind == 'products':
+            self._load_lookups()
+
+        for chunk in _chunks(rows, self.batch_size):
+            self._import_chunk(chunk)
+
+        # bulk_create skips the post_save signals, so the product lists are invalidated once here
+        if self.kind == 'products' and self.created:
+            catalogue_cache.invalidate(*PRODUCT_LIST_NAMESPACES)
+        return self.report()
+
+    def report(self):
+        return {'kind': self.kind, 'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+    def _load_lookups(self):
+        # Categories and brands are matched by id or case-insensitive title
+        self.categories = self._title_map(Category)
+        self.brands = self._title_map(Brand)
+
+        stores = Store.objects.all()
+        if self.store_ids is not None:
+            stores = stores.filter(id__in=self.store_ids)
+        self.stores = set(stores.values_list('id', flat=True))
+
+    @staticmethod
+    def _title_map(model):
+        lookup = {}
+        for pk, title in model.objects.values_list('id', 'title'):
+            lookup.setdefault(title.strip().lower(), pk)
+            lookup[str(pk)] = pk
+        return lookup
+
+    def _error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def _import_chunk(self, chunk):
+        if self.kind != 'products':
+            self._load_references(row for _, row in chunk)
+
+        pending = []
+        for line, row in chunk:
+            if row is None:
+                self._error(line, {'non_field_errors': ["Row could not be parsed"]})
+                continue
+
+            serializer = self.serializers[self.kind](data=row)
+            if not serializer.is_valid():
+                self._error(line, serializer.errors)
+                continue
+
+            data = dict(serializer.validated_data)
+            errors = self._resolve(data)
+            if errors:
+                self._error(line, errors)
+                continue
+            pending.append((line, self.models[self.kind](**data)))
+
+        if not pending:
+            return
+
+        try:
+            with transaction.atomic():
+                created = self.models[self.kind].objects.bulk_create([instance for _, instance in pending])
+                if self.kind == 'products':
+                    get_search_backend().index_products(created)
+                    index_facets(created, replace=False)
+        except DatabaseError as error:
+            # The batch is rolled back as a whole, so all of its rows are reported
+            for line, _ in pending:
+                self._error(line, {'non_field_errors': [str(error)]})
+            return
+
+        self.created += len(created)
+        self._sync(created)
+
+    def _load_references(self, rows):
+        references = set()
+        for row in rows:
+            try:
+                references.add(int(row['reference']))
+            except (TypeError, KeyError, ValueError):
+                continue
+
+        products = Product.objects.filter(id__in=references)
+        if self.store_ids is not None:
+            products = products.filter(store_ref_id__in=self.store_ids)
+        self.products = set(products.values_list('id', flat=True))
+
+    def _resolve(self, data):
+        if self.kind != 'products':
+            if data['reference'] not in self.products:
+                return {'reference': ["Product not found"]}
+            data['reference_id'] = data.pop('reference')
+            if self.kind == 'variations':
+                data.setdefault('condition', Variation.CONDITION_CHOICES[1][0])
+            return None
+
+        errors = {}
+        for field, lookup in (('category', self.categories), ('brand', self.brands)):
+            pk = lookup.get(data.pop(field).strip().lower())
+            if pk is None:
+                errors[field] = [f"Unknown {field}"]
+            data[f'{field}_id'] = pk
+
+        store_id = data.pop('store_ref')
+        if store_id not in self.stores:
+            errors['store_ref'] = ["Store reference does not exist"]
+        data['store_ref_id'] = store_id
+
+        data.setdefault('reviews', [])
+        data.setdefault('condition', Product.CONDITION_CHOICES[1][0])
+        return errors
+
+    def _sync(self, created):
+        if self.kind == 'products':
+            # Same bookkeeping the product post_save signal does for single saves
+            for product in created:
+                if product.is_available:
+                    product_sampler.add(product.id)
+                similar_products_index.update(product)
+            return
+
+        product_ids = {instance.reference_id for instance in created}
+        Product.objects.filter(id__in=product_ids).update(updated_at=timezone.now())
+        catalogue_cache.invalidate(*[single_product_namespace(product_id) for product_id in product_ids])
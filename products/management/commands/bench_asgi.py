@@ -0,0 +1,132 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Product
+from ratings.models import Rating
+from stores.models import Store
+
+# gunicorn's default sync workers behind core.wsgi, as in the Dockerfile, against the ASGI configuration.
+# The ASGI server with the sync views separates the cost of the ASGI handler from the gain of the async views.
+SERVERS = {
+    'wsgi': ['gunicorn', 'core.wsgi:application'],
+    'asgi-sync': ['gunicorn', '-c', 'core/gunicorn_asgi.py', '-e', 'ASYNC_READ_VIEWS=False', '-e', 'CONN_MAX_AGE=0',
+                  'core.asgi:application'],
+    'asgi': ['gunicorn', '-c', 'core/gunicorn_asgi.py', 'core.asgi:application'],
+}
+
+
+def endpoints():
+    # The read endpoints that have async views, pointed at rows that exist
+    product = Product.objects.order_by('id').values_list('id', flat=True).first()
+    rating = Rating.objects.order_by('id').values('product_reference', 'store_reference', 'user_id').first()
+    if product is None or rating is None or not Store.objects.exists():
+        raise CommandError("Seed some data first, for example with seed_scale")
+    return [
+        '/api/products/recommendations',
+        '/api/products/categories/home',
+        f"/api/products/singles?product_id={product}",
+        f"/api/ratings/reviews/product/?product_id={rating['product_reference']}",
+        f"/api/ratings/reviews/store/?store_id={rating['store_reference']}",
+        f"/api/ratings/reviews/user/?user_id={rating['user_id']}",
+        '/api/stores/all-stores?page=1&products_per_store=5',
+    ]
+
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def load(url, concurrency, duration):
+    # Every client sends its next request as soon as the previous one is answered
+    deadline = time.monotonic() + duration
+
+    def client():
+        results = []
+        while time.monotonic() < deadline:
+            results.append(fetch(url))
+        return results
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [result for batch in pool.map(lambda _: client(), range(concurrency)) for result in batch]
+    timings = [elapsed for elapsed, ok in results if ok]
+    return {
+        'rps': len(timings) / duration,
+        'errors': len(results) - len(timings),
+        'p50': statistics.median(timings) if timings else 0,
+        'p95': statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else (timings or [0])[0],
+    }
+
+
+class Command(BaseCommand):
+    help = ("Compare the throughput of the read endpoints under concurrent clients "
+            "between the WSGI deployment and the ASGI one with async views")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help="Simultaneous clients")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of load per endpoint")
+        parser.add_argument('--workers', type=int, default=2, help="Gunicorn workers of each server")
+        parser.add_argument('--port', type=int, default=8801)
+        parser.add_argument('--path', action='append', help="Only load this path (repeatable)")
+
+    def handle(self, *args, **options):
+        paths = options['path'] or endpoints()
+        base_url = f"http://127.0.0.1:{options['port']}"
+
+        results = {}
+        for name, command in SERVERS.items():
+            server = self.start(command, options['port'], options['workers'])
+            try:
+                for path in paths:
+                    # Warm up caches, the product sampler and connections before measuring
+                    for _ in range(options['workers'] * 4):
+                        fetch(base_url + path)
+                    results[name, path] = load(base_url + path, options['concurrency'], options['duration'])
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.stdout.write(f"{options['concurrency']} clients, {options['workers']} workers per server")
+        for path in paths:
+            self.stdout.write(path)
+            baseline = results['wsgi', path]['rps']
+            for name in SERVERS:
+                result = results[name, path]
+                relative = f"{result['rps'] / baseline:5.2f}x" if baseline else '    -'
+                self.stdout.write(
+                    f"  {name:<10}{result['rps']:8.1f} req/s {relative}  p50 {result['p50']:8.1f} ms"
+                    f"  p95 {result['p95']:8.1f} ms  errors {result['errors']}"
+                )
+
+    def start(self, command, port, workers):
+        server = subprocess.Popen(
+            [*command, '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+        )
+        # Wait until the server answers
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{' '.join(command)} exited with {server.returncode}")
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/api/products/categories', timeout=1).read()
+                return server
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"{' '.join(command)} did not start on port {port}")
@@ -0,0 +1,374 @@
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from importlib import import_module
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from address.models import Address
+from orders.models import Order
+from products.cache import catalogue_cache
+from products.models import Product
+from ratings.models import Rating
+from stores.models import Store, StoreOrder
+
+URL_MODULES = {
+    'products': '/api/products/',
+    'stores': '/api/stores/',
+    'orders': '/api/orders/',
+    'ratings': '/api/ratings/',
+    'address': '/api/address/',
+}
+
+# Most queries an endpoint may run on a cold cache, keyed by "<app>:<url name>"
+QUERY_BUDGETS = {
+    'products:home_categories': 2,
+    'products:categories': 2,
+    'products:brands': 2,
+    'products:recommendations': 2,
+    'products:discounts': 1,
+    'products:category-products-list': 1,
+    'products:brand-products-list': 1,
+    'products:similar-products': 2,
+    'products:search': 3,
+    'products:search-facets': 9,
+    'products:singles': 4,
+    'products:batch': 3,
+    'products:add-variations': 5,
+    'products:add-accessory': 9,
+    'products:add-product': 8,
+    'products:import': 8,
+    'products:check-availability': 1,
+    'products:check-availability-bulk': 2,
+    'products:cache-stats': 1,
+    'stores:create_store': 5,
+    'stores:retrieve_store': 5,
+    'stores:all_stores': 6,
+    'stores:store_orders': 4,
+    'stores:store_statistics': 3,
+    'stores:sales_chart': 2,
+    'orders:get_orders': 2,
+    'orders:get_order': 2,
+    'orders:add_order': 18,
+    'ratings:get-user-reviews': 2,
+    'ratings:get-store-reviews': 2,
+    'ratings:get-product-reviews': 2,
+    'ratings:add-rating': 13,
+    'address:add_address': 3,
+    'address:retrieve_address': 1,
+    'address:update_address': 4,
+    'address:delete_address': 5,
+    'address:get_address': 1,
+}
+
+# The status of each scenario's success path, 200 unless listed; budgets only count for that path
+EXPECTED_STATUSES = {
+    'products:add-variations': 201,
+    'products:add-accessory': 201,
+    'products:add-product': 201,
+    'stores:create_store': 201,
+    'orders:add_order': 201,
+    'ratings:add-rating': 201,
+    'address:add_address': 201,
+    'address:delete_address': 204,
+}
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class QueryCounter:
+    """Database execute wrapper counting statements; unlike the query log it survives request_started."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Savepoints depend on how deeply the request is nested in transactions, not on what it queries
+        if not sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Fixtures:
+    """Representative rows of the seeded dataset the scenarios point at."""
+
+    def __init__(self):
+        # The most rated product and the store and shopper with the most orders are the hot paths
+        self.product = Product.objects.annotate(ratings_total=Count('rating')).order_by('-ratings_total').first()
+        self.category_id = self.product.category_id
+        self.brand_id = self.product.brand_id
+        # A cart-sized multi-get
+        self.batch_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:20])
+
+        busiest = StoreOrder.objects.values('store_reference').annotate(total=Count('id')).order_by('-total').first()
+        self.store = Store.objects.get(id=busiest['store_reference']) if busiest else self.product.store_ref
+        self.owner_token = Token.objects.get_or_create(user=self.store.owner)[0].key
+        # The admin routes need a staff user and opening a store needs a user without one; both are kept
+        # between runs, as the scenarios' writes are rolled back
+        admin = User.objects.update_or_create(username='bench-admin', defaults={'is_staff': True})[0]
+        self.admin_token = Token.objects.get_or_create(user=admin)[0].key
+        seller = User.objects.get_or_create(username='bench-seller')[0]
+        self.seller_token = Token.objects.get_or_create(user=seller)[0].key
+
+        self.order = Order.objects.values('user').annotate(total=Count('id')).order_by('-total').first()
+        self.user_id = self.order['user'] if self.order else '1'
+        self.order = Order.objects.filter(user=self.user_id).order_by('-id').first()
+        self.address = Address.objects.filter(user=self.user_id).order_by('-is_default', 'id').first()
+        # Deleting an address cascades to its orders, so the delete scenario uses one without any
+        self.spare_address = Address.objects.filter(order__isnull=True, storeorder__isnull=True).first()
+        self.review_user = Rating.objects.values_list('user_id', flat=True).first() or self.user_id
+
+
+def scenarios(f):
+    """(key, method, path, request kwargs, writes) for every benchmarked route."""
+    product_id = f.product.id
+    store_id = f.store.id
+    auth = {'HTTP_AUTHORIZATION': f'Token {f.owner_token}'}
+    admin = {'HTTP_AUTHORIZATION': f'Token {f.admin_token}'}
+    seller = {'HTTP_AUTHORIZATION': f'Token {f.seller_token}'}
+    address_query = f"user_id={f.user_id}&address_id={f.address.id if f.address else 0}"
+    spare = f.spare_address
+    spare_query = f"user_id={spare.user if spare else ''}&address_id={spare.id if spare else 0}"
+    order_items = [{'product': product_id, 'user_id': f.user_id, 'store': f.product.store_ref_id, 'quantity': 1,
+                    'price': str(f.product.price), 'color': f.product.color}]
+
+    return [
+        ('products:home_categories', 'get', 'categories/home', {}, False),
+        ('products:categories', 'get', 'categories', {}, False),
+        ('products:brands', 'get', 'brands/', {}, False),
+        ('products:recommendations', 'get', 'recommendations', {}, False),
+        ('products:discounts', 'get', 'discounts', {'data': {'cursor': ''}}, False),
+        ('products:category-products-list', 'get', 'category-products-list',
+         {'data': {'category_id': f.category_id, 'cursor': ''}}, False),
+        ('products:brand-products-list', 'get', 'brand-products-list',
+         {'data': {'brand_id': f.brand_id, 'cursor': ''}}, False),
+        ('products:similar-products', 'get', 'similar-products',
+         {'data': {'category': f.category_id, 'product_id': product_id}}, False),
+        ('products:search', 'get', 'search', {'data': {'title': f.product.product_type, 'cursor': ''}}, False),
+        ('products:search-facets', 'get', 'search/facets', {'data': {'title': f.product.product_type}}, False),
+        ('products:singles', 'get', 'singles', {'data': {'product_id': product_id}}, False),
+        ('products:batch', 'get', 'batch', {'data': {'ids': ','.join(map(str, f.batch_ids))}}, False),
+        ('products:add-variations', 'post', 'add-variations', {'data': {
+            'reference': product_id, 'title': 'Bench variation', 'color': 'black', 'capacity': '64GB',
+            'price': '10.00', 'image_url': 'https://cdn.example.com/bench.png'}, 'content_type': 'application/json'},
+         True),
+        ('products:add-accessory', 'post', 'add-accessory', {'data': {
+            'reference': product_id, 'title': 'Bench accessory', 'price': '5.00',
+            'image_url': 'https://cdn.example.com/bench.png'}, 'content_type': 'application/json'}, True),
+        ('products:add-product', 'post', 'add-product', {'data': {
+            'title': 'Bench product', 'price': '99.00', 'description': 'Benchmark', 'product_type': 'phone',
+            'condition': 'new', 'reviews': [], 'color': 'black', 'image_urls': [], 'capacity': '64GB',
+            'category': f.category_id, 'brand': f.brand_id, 'store_ref': f.product.store_ref_id},
+            'content_type': 'application/json'}, True),
+        ('products:import', 'post', 'import', {'data': {'kind': 'variations'}, 'files': (
+            'variations.csv',
+            'title,color,capacity,price,image_url,reference\n'
+            + f'Bench,black,64GB,10.00,https://cdn.example.com/bench.png,{product_id}\n' * 20,
+        ), **auth}, True),
+        ('products:check-availability', 'get', 'check-availability', {'data': {'product_id': product_id}}, False),
+        ('products:check-availability-bulk', 'post', 'check-availability/bulk', {
+            'data': {'items': [{'product_id': product_id, 'quantity': 1}] * 20},
+            'content_type': 'application/json'}, False),
+        ('products:cache-stats', 'get', 'cache-stats', admin, False),
+        ('stores:create_store', 'post', 'add-store', {'data': {
+            'title': 'Bench store', 'address': '1 Bench Road', 'coverUrl': 'https://cdn.example.com/cover.png',
+            'opening_hours': {'mon': '9-5'}}, 'content_type': 'application/json', **seller}, True),
+        ('stores:retrieve_store', 'get', 'retrieve', auth, False),
+        ('stores:all_stores', 'get', 'all-stores', {'data': {'products_per_store': 10}}, False),
+        ('stores:store_orders', 'get', 'store-orders', {'data': {'store_id': store_id, 'cursor': ''}}, False),
+        ('stores:store_statistics', 'get', 'store-statistics', {'data': {'store_id': store_id}}, False),
+        ('stores:sales_chart', 'get', 'sales-chart', {'data': {'store_id': store_id, 'period': 'monthly'}}, False),
+        ('orders:get_orders', 'get', 'user-orders', {'data': {
+            'user_id': f.user_id, 'order_status': 'pending', 'cursor': ''}}, False),
+        ('orders:get_order', 'get', 'order', {'data': {'order_id': f.order.id if f.order else 0}}, False),
+        ('orders:add_order', 'post', 'add-order', {'data': {
+            'user': f.user_id, 'total_price': str(f.product.price), 'delivery_price': '0.00',
+            'address': f.address.id if f.address else None, 'order_items': order_items},
+            'content_type': 'application/json'}, True),
+        ('ratings:get-user-reviews', 'get', 'reviews/user/', {'data': {'user_id': f.review_user, 'cursor': ''}},
+         False),
+        ('ratings:get-store-reviews', 'get', 'reviews/store/', {'data': {'store_id': store_id, 'cursor': ''}}, False),
+        ('ratings:get-product-reviews', 'get', 'reviews/product/', {'data': {'product_id': product_id, 'cursor': ''}},
+         False),
+        ('ratings:add-rating', 'post', 'ratings/', {'data': {
+            'userId': f.user_id, 'user_id': f.user_id, 'product_reference': product_id,
+            'store_reference': f.product.store_ref_id, 'order_reference': f.order.id if f.order else 0,
+            'product_rating': 4, 'store_rating': 5, 'review': 'Benchmark review'},
+            'content_type': 'application/json'}, True),
+        ('address:add_address', 'post', 'add-address', {'data': {
+            'user': f.user_id, 'phone_number': '+27710000000', 'address': '1 Bench Road', 'city': 'Durban',
+            'contact_name': 'Bench', 'is_default': True}, 'content_type': 'application/json'}, True),
+        ('address:retrieve_address', 'get', 'retrieve', {'data': {'user_id': f.user_id}}, False),
+        ('address:update_address', 'put', f'update-address?{address_query}', {}, True),
+        ('address:delete_address', 'delete', f'delete-address?{spare_query}', {}, True),
+        ('address:get_address', 'get', 'get-address', {'data': {'user_id': f.user_id}}, False),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API route against the current dataset and check the per-endpoint query budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help="Timed requests per endpoint")
+        parser.add_argument('--cold', action='store_true', help="Clear the caches before every timed request")
+        parser.add_argument('--only', nargs='+', default=[], help="Only run endpoints whose key contains one of these")
+        parser.add_argument('--output', default='bench-report.json')
+        parser.add_argument('--compare', help="Earlier report to print the differences against")
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError("The database is empty; seed it first with `manage.py seed_scale`")
+
+        # Lets the test client through ALLOWED_HOSTS and keeps outgoing email in memory;
+        # server errors show up as statuses in the report rather than tracebacks
+        setup_test_environment()
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        try:
+            report = self.run(options)
+        finally:
+            request_logger.disabled = False
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        self.stdout.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+        if report['unbenchmarked']:
+            self.stdout.write(self.style.WARNING(f"Routes without a scenario: {', '.join(report['unbenchmarked'])}"))
+        if report['unexpected_status']:
+            raise CommandError(f"Not on their success path: {', '.join(report['unexpected_status'])}")
+        if report['over_budget']:
+            raise CommandError(f"Over the query budget: {', '.join(report['over_budget'])}")
+
+    def run(self, options):
+        fixtures = Fixtures()
+        # Broken endpoints are reported with their status instead of stopping the run
+        client = Client(raise_request_exception=False)
+        endpoints = {}
+
+        self.stdout.write(f"{'endpoint':<36} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'peak KiB':>9}")
+        for key, method, path, kwargs, writes in scenarios(fixtures):
+            if options['only'] and not any(part in key for part in options['only']):
+                continue
+
+            url = URL_MODULES[key.split(':')[0]] + path
+            call = self.request_factory(client, method, url, kwargs, writes)
+
+            # Queries are counted on a cold cache so the budget covers the uncached path
+            self.clear_caches()
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                status = call().status_code
+
+            tracemalloc.start()
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            timings = []
+            for _ in range(options['runs']):
+                if options['cold']:
+                    self.clear_caches()
+                start = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - start) * 1000)
+
+            result = {
+                'method': method.upper(),
+                'path': url,
+                'status': status,
+                'expected_status': EXPECTED_STATUSES.get(key, 200),
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+                'queries': queries.count,
+                'budget': QUERY_BUDGETS.get(key),
+                'peak_kib': round(peak / 1024, 1),
+            }
+            endpoints[key] = result
+
+            over = result['budget'] is not None and result['queries'] > result['budget']
+            line = (f"{key:<36} {status:>6} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                    f"{result['queries']:>8} {result['peak_kib']:>9.1f}")
+            self.stdout.write(self.style.ERROR(line) if over or status != result['expected_status'] else line)
+
+        return {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'runs': options['runs'],
+            'cold': options['cold'],
+            'endpoints': endpoints,
+            'unbenchmarked': sorted(self.route_keys() - {key for key, *_ in scenarios(fixtures)}),
+            'unexpected_status': sorted(key for key, result in endpoints.items()
+                                        if result['status'] != result['expected_status']),
+            'over_budget': sorted(key for key, result in endpoints.items()
+                                  if result['budget'] is not None and result['queries'] > result['budget']),
+        }
+
+    @staticmethod
+    def request_factory(client, method, url, kwargs, writes):
+        kwargs = dict(kwargs)
+        upload = kwargs.pop('files', None)
+
+        def call():
+            request_kwargs = dict(kwargs)
+            if upload:
+                # A fresh file object per request, since the view reads it to the end
+                name, content = upload
+                request_kwargs['data'] = {**kwargs.get('data', {}), 'file': SimpleUploadedFile(name, content.encode())}
+
+            if not writes:
+                return getattr(client, method)(url, **request_kwargs)
+
+            # Writes are rolled back so every run sees the same data
+            with transaction.atomic():
+                response = getattr(client, method)(url, **request_kwargs)
+                transaction.set_rollback(True)
+            return response
+
+        return call
+
+    @staticmethod
+    def clear_caches():
+        catalogue_cache.local.clear()
+        caches[catalogue_cache.backend].clear()
+
+    @staticmethod
+    def route_keys():
+        keys = set()
+        for app in URL_MODULES:
+            for pattern in import_module(f'{app}.urls').urlpatterns:
+                keys.add(f'{app}:{pattern.name}')
+        return keys
+
+    def compare(self, path, report):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)['endpoints']
+
+        self.stdout.write(f"\n{'endpoint':<36} {'p50 ms, change':>16} {'queries':>10}")
+        for key, result in report['endpoints'].items():
+            before = previous.get(key)
+            if before is None:
+                continue
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line = (f"{key:<36} {before['p50_ms']:>7.2f} {change:>+7.1f}% "
+                    f"{before['queries']:>4} -> {result['queries']:<3}")
+            regressed = result['queries'] > before['queries'] or change > 20
+            self.stdout.write(self.style.WARNING(line) if regressed else line)
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+
+from products.models import Product
+from products.views import ProductPagination
+
+
+class Command(BaseCommand):
+    help = "Compare deep-page latency of offset paging against keyset paging on the discounts list"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depths', nargs='+', type=int, default=[1, 10, 100, 1000, 10000])
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.filter(discount__gt=0)
+        page_size = options['page_size']
+        total = queryset.count()
+        factory = RequestFactory()
+
+        self.stdout.write(f"{total} discounted products, page size {page_size}")
+        self.stdout.write(f"{'page':>8}  {'offset p50 (ms)':>16}  {'keyset p50 (ms)':>16}")
+
+        for depth in options['depths']:
+            offset = (depth - 1) * page_size
+            if offset >= total:
+                break
+
+            # The keyset request starts right after the last row of the previous page, as a `next` link would
+            paginator = ProductPagination()
+            position = None
+            if offset:
+                row = queryset.order_by(*paginator.ordering).values(*paginator.ordering)[offset - 1]
+                position = paginator._get_position_from_instance(row, paginator.ordering)
+            paginator.base_url = '/api/products/discounts'
+            cursor = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=position)).split('cursor=')[1]
+
+            offset_request = Request(factory.get('/api/products/discounts', {'page': depth, 'page_size': page_size}))
+            keyset_request = Request(factory.get('/api/products/discounts', {'cursor': cursor, 'page_size': page_size}))
+
+            offset_ms = self._time(queryset, offset_request, options['runs'])
+            keyset_ms = self._time(queryset, keyset_request, options['runs'])
+            self.stdout.write(f"{depth:>8}  {offset_ms:>16.2f}  {keyset_ms:>16.2f}")
+
+    @staticmethod
+    def _time(queryset, request, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            ProductPagination().paginate_queryset(queryset, request)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
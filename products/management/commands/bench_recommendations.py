@@ -0,0 +1,57 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.sampling import ProductSampler
+
+
+class Command(BaseCommand):
+    help = "Benchmark the recommendations sampler against the old shuffle-everything approach"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+        parser.add_argument('--k', type=int, default=20)
+        parser.add_argument('--runs', type=int, default=200)
+
+    def handle(self, *args, **options):
+        k = options['k']
+        runs = options['runs']
+
+        self.stdout.write(f"{'products':>10}  {'sampler p50 (us)':>18}  {'sampler p95 (us)':>18}  {'shuffle p50 (us)':>18}")
+
+        for size in options['sizes']:
+            ids = list(range(1, size + 1))
+            sampler = ProductSampler(refresh_interval=float('inf'))
+            sampler.rebuild(ids)
+
+            sampler_timings = self._time(lambda: sampler.sample(k), runs)
+            # The old view copied and shuffled every row before slicing, so time that on the same IDs
+            shuffle_timings = self._time(lambda: self._shuffle_all(ids, k), max(1, runs // 20))
+
+            self.stdout.write(
+                f"{size:>10}  {self._percentile(sampler_timings, 50):>18.1f}  "
+                f"{self._percentile(sampler_timings, 95):>18.1f}  {self._percentile(shuffle_timings, 50):>18.1f}"
+            )
+
+    @staticmethod
+    def _shuffle_all(ids, k):
+        rows = list(ids)
+        random.shuffle(rows)
+        return rows[:k]
+
+    @staticmethod
+    def _time(func, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1_000_000)
+        return timings
+
+    @staticmethod
+    def _percentile(timings, percentile):
+        if len(timings) < 2:
+            return timings[0]
+        return statistics.quantiles(timings, n=100)[percentile - 1]
@@ -0,0 +1,39 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import IContainsSearchBackend, get_search_backend, search_terms
+
+
+class Command(BaseCommand):
+    help = "Compare product search latency of the full-text index against the old icontains filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Build realistic queries, including partial words, from the titles that exist
+        titles = list(Product.objects.order_by('?').values_list('title', flat=True)[:1000])
+        words = [word for title in titles for word in search_terms(title) if len(word) > 2]
+        if not words:
+            self.stderr.write("No products to search, seed some data first")
+            return
+        queries = [rng.choice(words)[:rng.randint(3, 6)] for _ in range(options['queries'])]
+
+        for backend in (IContainsSearchBackend(), get_search_backend()):
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                backend.search(query)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            p95 = statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+            self.stdout.write(
+                f"{type(backend).__name__:<28} p50 {statistics.median(timings):8.2f} ms  p95 {p95:8.2f} ms"
+            )
@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from address.models import Address
+from address.serializers import AddressSerializer
+from core.compiled import compile_serializer
+from core.renderers import ORJSONRenderer
+from products.models import Brand, Category, Product
+from products.serializers import BrandSerializer, CategorySerializer, ProductListSerializer
+from ratings.models import Rating
+from ratings.serializers import RatingSerializer
+
+
+def serializer_cases():
+    # The list serializers the compiled views use, with the ordering of their views
+    return [
+        ('products', ProductListSerializer, Product.objects.order_by('id')),
+        ('categories', CategorySerializer, Category.objects.order_by('id')),
+        ('brands', BrandSerializer, Brand.objects.order_by('id')),
+        ('ratings', RatingSerializer, Rating.objects.order_by('-id')),
+        ('addresses', AddressSerializer, Address.objects.order_by('-created_at')),
+    ]
+
+
+def median_ms(call, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ("Compare fetching, serialising and rendering list pages through the ModelSerializers and DRF's "
+            "JSONRenderer against `.values()` rows, the compiled serializers and the orjson renderer")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per list")
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, runs = options['rows'], options['runs']
+        self.stdout.write(f"median of {runs} runs, ms")
+        self.stdout.write(f"{'list':<12}{'rows':>6}  {'':<10}{'fetch':>9}{'serialise':>11}{'render':>9}{'total':>9}")
+
+        for name, serializer_class, queryset in serializer_cases():
+            compiled = compile_serializer(serializer_class)
+            instances = list(queryset[:rows])
+            values = list(compiled.values(queryset)[:rows])
+            if not instances:
+                continue
+
+            current = serializer_class(instances, many=True).data
+            fast = compiled.serialize(values)
+            timings = {
+                'current': (
+                    median_ms(lambda: list(queryset[:rows]), runs),
+                    median_ms(lambda: serializer_class(instances, many=True).data, runs),
+                    median_ms(lambda: JSONRenderer().render(current), runs),
+                ),
+                'compiled': (
+                    median_ms(lambda: list(compiled.values(queryset)[:rows]), runs),
+                    median_ms(lambda: compiled.serialize(values), runs),
+                    median_ms(lambda: ORJSONRenderer().render(fast), runs),
+                ),
+            }
+
+            for variant, (fetch, serialise, render) in timings.items():
+                label = name if variant == 'current' else ''
+                count = len(instances) if variant == 'current' else ''
+                self.stdout.write(f"{label:<12}{count:>6}  {variant:<10}{fetch:>9.2f}{serialise:>11.2f}"
+                                  f"{render:>9.2f}{fetch + serialise + render:>9.2f}")
+            speedup = sum(timings['current']) / sum(timings['compiled'])
+            self.stdout.write(f"{'':<20}{'speedup':<10}{'':>38}{speedup:>8.1f}x")
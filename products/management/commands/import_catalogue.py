@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import CatalogueImporter, FORMATS, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream products, variations or accessories from a CSV or JSONL file into the catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=list(CatalogueImporter.serializers), default='products')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        importer = CatalogueImporter(options['kind'], batch_size=options['batch_size'])
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = importer.run(read_rows(stream, file_format))
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} {report['kind']}, {report['failed']} rows failed"
+        ))
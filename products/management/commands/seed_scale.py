@@ -0,0 +1,372 @@
+import math
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from address.models import Address
+from orders.models import Order, OrderItem
+from products.cache import catalogue_cache, HOME_CATEGORIES, CATEGORIES, BRANDS, PRODUCT_LIST_NAMESPACES
+from products.facets import index_facets
+from products.models import Accessory, Brand, Category, Product, Variation
+from ratings.models import Rating
+from stores.models import Store, StoreOrder
+
+PRODUCT_TYPES = ['phone', 'laptop', 'tablet', 'headphones', 'watch', 'camera', 'console', 'speaker', 'monitor', 'tv']
+COLORS = ['black', 'white', 'silver', 'blue', 'red', 'green', 'gold', 'purple']
+CAPACITIES = ['32GB', '64GB', '128GB', '256GB', '512GB', '1TB']
+WORDS = ['pro', 'max', 'ultra', 'lite', 'mini', 'plus', 'air', 'neo', 'edge', 'prime', 'go', 'one']
+CITIES = ['Johannesburg', 'Cape Town', 'Durban', 'Pretoria', 'Port Elizabeth', 'Bloemfontein']
+REVIEWS = ['Great value', 'Works as described', 'Fast delivery', 'Battery could be better', 'Would buy again',
+           'Not what I expected', 'Excellent build quality', 'Decent for the price']
+
+# Weighted choices: most orders end up delivered and most ratings are positive
+ORDER_STATUSES = (['delivered', 'shipped', 'confirmed', 'pending', 'canceled'], [55, 10, 10, 15, 10])
+STORE_ORDER_STATUSES = {'pending': 'pending', 'confirmed': 'confirmed', 'shipped': 'processing',
+                        'delivered': 'delivered', 'canceled': 'canceled'}
+PAYMENT_METHODS = (['card', 'balance', 'stripe', 'paypal', 'ozow'], [40, 25, 15, 10, 10])
+STARS = ([1, 2, 3, 4, 5], [5, 5, 10, 30, 50])
+
+# Column order of the value tuples written by seed_orders
+ORDER_COLUMNS = ['id', 'user', 'total_price', 'delivery_price', 'order_status', 'payment_method', 'payment_status',
+                 'address', 'rated_products', 'created_at', 'updated_at']
+ORDER_ITEM_COLUMNS = ['id', 'reference', 'product', 'user_id', 'store', 'quantity', 'price', 'color', 'capacity',
+                      'order_status']
+STORE_ORDER_COLUMNS = ['id', 'store_reference', 'order_reference', 'order_status', 'address', 'created_at',
+                       'updated_at']
+
+
+class Skewed:
+    """Draws indexes in [0, n) with Zipf-like weights, so a few rows get most of the traffic."""
+
+    def __init__(self, rng, n, exponent=1.1):
+        self.rng = rng
+        self.population = range(n)
+        self.cum_weights = list(_accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+    def draw(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+
+def _accumulate(values):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    # bulk_create would stamp every row with the current time; seeded rows carry their own history
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert_rows(model, field_names, rows):
+    """
+    INSERT tuples of database-ready values with one executemany call.
+
+    Used instead of bulk_create for the order tables, which hold millions of
+    rows: the statement is compiled once rather than once per few hundred
+    rows, and values shared by many rows (timestamps) are prepared once.
+    """
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = (f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(field.column) for field in fields)}) "
+           f"VALUES ({', '.join(['%s'] * len(fields))})")
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def db_value(model, field_name, value):
+    return model._meta.get_field(field_name).get_db_prep_save(value, connection)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = "Generate a large, reproducible catalogue, order and rating dataset for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--orders', type=int, help="Defaults to two orders per product")
+        parser.add_argument('--items-per-order', type=float, default=2.5, help="Average order size")
+        parser.add_argument('--ratings', type=int, help="Defaults to one rating per product")
+        parser.add_argument('--users', type=int, help="Defaults to one user per five products")
+        parser.add_argument('--stores', type=int, help="Defaults to one store per 5000 products, at least 10")
+        parser.add_argument('--categories', type=int, default=30)
+        parser.add_argument('--brands', type=int, default=200)
+        parser.add_argument('--days', type=int, default=365, help="Spread orders and ratings over this many days")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help="Do not rebuild the search index, sales rollups and rating aggregates afterwards")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.now = timezone.now()
+        self.started = time.perf_counter()
+
+        products = options['products']
+        orders = options['orders'] if options['orders'] is not None else products * 2
+        ratings = options['ratings'] if options['ratings'] is not None else products
+        users = options['users'] or max(100, products // 5)
+        stores = options['stores'] or max(10, products // 5000)
+
+        with explicit_timestamps(Address, Rating):
+            self.seed_users(max(users, stores))
+            self.seed_taxonomy(options['categories'], options['brands'])
+            self.seed_stores(stores)
+            self.seed_products(products)
+            self.seed_addresses()
+            self.seed_orders(orders, options['items_per_order'])
+            self.seed_ratings(ratings)
+
+        # Explicit primary keys leave the Postgres sequences behind
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Product, Address, Order, OrderItem,
+                                                                       StoreOrder]):
+                cursor.execute(sql)
+
+        # bulk_create skips the signals that keep the derived data in step
+        if not options['skip_rollups']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('backfill_store_sales', stdout=self.stdout)
+            call_command('reconcile_ratings', stdout=self.stdout)
+        catalogue_cache.invalidate(HOME_CATEGORIES, CATEGORIES, BRANDS, *PRODUCT_LIST_NAMESPACES)
+        self.log("Done")
+
+    def log(self, message):
+        self.stdout.write(f"[{time.perf_counter() - self.started:7.1f}s] {message}")
+
+    def past(self):
+        # Recent days are busier than old ones
+        return self.now - timedelta(days=self.days * self.rng.betavariate(1, 3))
+
+    def batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(start + self.batch_size, count))
+
+    def seed_users(self, count):
+        first = next_id(User)
+        password = make_password(None)  # Unusable, hashed once for every row
+        for batch in self.batches(count):
+            User.objects.bulk_create([
+                User(id=first + i, username=f'shopper{first + i}', email=f'shopper{first + i}@example.com',
+                     password=password)
+                for i in batch
+            ])
+        self.user_ids = range(first, first + count)
+        self.user_draw = Skewed(self.rng, count, exponent=0.8)
+        self.log(f"{count} users")
+
+    def seed_taxonomy(self, categories, brands):
+        Category.objects.bulk_create([
+            Category(title=f'Category {i}', imageUrl=f'https://cdn.example.com/categories/{i}.png')
+            for i in range(categories)
+        ])
+        Brand.objects.bulk_create([
+            Brand(title=f'Brand {i}', imageUrl=f'https://cdn.example.com/brands/{i}.png') for i in range(brands)
+        ])
+        self.category_ids = list(Category.objects.order_by('-id').values_list('id', flat=True)[:categories])
+        self.brand_ids = list(Brand.objects.order_by('-id').values_list('id', flat=True)[:brands])
+        self.category_draw = Skewed(self.rng, categories, exponent=0.7)
+        self.brand_draw = Skewed(self.rng, brands)
+        self.log(f"{categories} categories, {brands} brands")
+
+    def seed_stores(self, count):
+        hours = {day: '9-17' for day in ('mon', 'tue', 'wed', 'thu', 'fri', 'sat')}
+        Store.objects.bulk_create([
+            Store(title=f'Store {i}', address=f'{i} Main Road', coverUrl=f'https://cdn.example.com/stores/{i}.png',
+                  opening_hours=hours, is_open=self.rng.random() < 0.8, is_featured=self.rng.random() < 0.05,
+                  owner_id=self.user_ids[i])
+            for i in range(count)
+        ])
+        self.store_ids = list(Store.objects.order_by('-id').values_list('id', flat=True)[:count])
+        self.store_draw = Skewed(self.rng, count)
+        self.log(f"{count} stores")
+
+    def seed_products(self, count):
+        rng = self.rng
+        first = next_id(Product)
+        # Compact per-product columns the orders and ratings are generated from
+        self.product_store = array('q')
+        self.product_price = array('q')  # In cents
+
+        for batch in self.batches(count):
+            products, variations, accessories = [], [], []
+            stores = self.store_draw.draw(len(batch))
+            categories = self.category_draw.draw(len(batch))
+            brands = self.brand_draw.draw(len(batch))
+
+            for position, i in enumerate(batch):
+                product_id = first + i
+                cents = int(min(max(math.exp(rng.gauss(5.5, 1.0)), 5), 20000) * 100)
+                product_type = rng.choice(PRODUCT_TYPES)
+                colors = rng.sample(COLORS, rng.randint(1, 3))
+                capacities = rng.sample(CAPACITIES, rng.randint(1, 3))
+                store_id = self.store_ids[stores[position]]
+                self.product_store.append(store_id)
+                self.product_price.append(cents)
+
+                products.append(Product(
+                    id=product_id,
+                    title=f'{product_type.title()} {rng.choice(WORDS)} {product_id}',
+                    price=Decimal(cents) / 100,
+                    discount=rng.choice([5, 10, 15, 20, 30]) if rng.random() < 0.2 else 0,
+                    is_available=rng.random() < 0.95,
+                    stock=rng.randint(0, 500) if rng.random() < 0.7 else None,
+                    description=f'{product_type} with {", ".join(capacities)} storage in {", ".join(colors)}',
+                    is_featured=rng.random() < 0.02,
+                    product_type=product_type,
+                    condition=rng.choices(['new', 'refurbished', 'used'], [70, 20, 10])[0],
+                    reviews=[],
+                    color=', '.join(colors),
+                    image_urls=[f'https://cdn.example.com/products/{product_id}/{n}.jpg' for n in range(3)],
+                    capacity=', '.join(capacities),
+                    category_id=self.category_ids[categories[position]],
+                    brand_id=self.brand_ids[brands[position]],
+                    store_ref_id=store_id,
+                ))
+
+                for color in colors[:rng.randint(0, 3)]:
+                    variations.append(Variation(
+                        title=f'{product_type.title()} {color}', color=color, capacity=rng.choice(capacities),
+                        condition='new', price=Decimal(cents + rng.randint(0, 5000)) / 100, reference_id=product_id,
+                        stock=rng.randint(0, 100), image_url=f'https://cdn.example.com/products/{product_id}/v.jpg',
+                    ))
+                if rng.random() < 0.3:
+                    accessories.append(Accessory(
+                        title=f'{product_type.title()} case', price=Decimal(rng.randint(500, 5000)) / 100,
+                        reference_id=product_id, image_url=f'https://cdn.example.com/products/{product_id}/a.jpg',
+                    ))
+
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+                index_facets(products, replace=False)
+                Variation.objects.bulk_create(variations)
+                Accessory.objects.bulk_create(accessories)
+
+        self.product_ids = range(first, first + count)
+        self.product_draw = Skewed(self.rng, count)
+        self.log(f"{count} products with variations and accessories")
+
+    def seed_addresses(self):
+        first = next_id(Address)
+        self.default_address = array('q')
+        address_id = first
+
+        for batch in self.batches(len(self.user_ids)):
+            addresses = []
+            for i in batch:
+                user_id = self.user_ids[i]
+                created_at = self.past()
+                for n in range(1 if self.rng.random() < 0.7 else 2):
+                    addresses.append(Address(
+                        id=address_id, user=str(user_id), phone_number=f'+2771{user_id:07d}',
+                        address=f'{self.rng.randint(1, 999)} Long Street', city=self.rng.choice(CITIES),
+                        contact_name=f'Shopper {user_id}', tag=['Home', 'Work'][n], is_default=n == 0,
+                        created_at=created_at, updated_at=created_at,
+                    ))
+                    if n == 0:
+                        self.default_address.append(address_id)
+                    address_id += 1
+            Address.objects.bulk_create(addresses)
+        self.log(f"{address_id - first} addresses")
+
+    def seed_orders(self, count, items_per_order):
+        rng = self.rng
+        order_id, item_id, store_order_id = next_id(Order), next_id(OrderItem), next_id(StoreOrder)
+        through = StoreOrder.order_items.through
+        no_rated_products = db_value(Order, 'rated_products', [])
+        total_items = 0
+
+        for batch in self.batches(count):
+            orders, items, store_orders, links = [], [], [], []
+            users = self.user_draw.draw(len(batch))
+
+            for position in range(len(batch)):
+                user_index = users[position]
+                user_id = str(self.user_ids[user_index])
+                order_status = rng.choices(*ORDER_STATUSES)[0]
+                created_at = db_value(Order, 'created_at', self.past())
+                size = 1 + int(rng.expovariate(1 / max(items_per_order - 1, 0.01)))
+
+                by_store = {}
+                total = 0
+                for product_index in self.product_draw.draw(size):
+                    quantity = rng.choices([1, 2, 3], [80, 15, 5])[0]
+                    cents = self.product_price[product_index]
+                    store_id = self.product_store[product_index]
+                    total += cents * quantity
+                    items.append((item_id, order_id, self.product_ids[product_index], user_id, store_id, quantity,
+                                  Decimal(cents) / 100, rng.choice(COLORS), rng.choice(CAPACITIES), order_status))
+                    by_store.setdefault(store_id, []).append(item_id)
+                    item_id += 1
+
+                delivery = rng.choice([0, 5000, 9900])
+                address_id = self.default_address[user_index]
+                payment_status = 'pending' if order_status in ('pending', 'canceled') else 'completed'
+                orders.append((order_id, user_id, Decimal(total + delivery) / 100, Decimal(delivery) / 100,
+                               order_status, rng.choices(*PAYMENT_METHODS)[0], payment_status, address_id,
+                               no_rated_products, created_at, created_at))
+
+                # One store order per store in the order, as checkout splits them
+                for store_id, store_item_ids in by_store.items():
+                    store_orders.append((store_order_id, store_id, order_id, STORE_ORDER_STATUSES[order_status],
+                                         address_id, created_at, created_at))
+                    links.extend((store_order_id, linked) for linked in store_item_ids)
+                    store_order_id += 1
+                order_id += 1
+
+            with transaction.atomic():
+                insert_rows(Order, ORDER_COLUMNS, orders)
+                insert_rows(OrderItem, ORDER_ITEM_COLUMNS, items)
+                insert_rows(StoreOrder, STORE_ORDER_COLUMNS, store_orders)
+                insert_rows(through, ['storeorder', 'orderitem'], links)
+            total_items += len(items)
+
+        self.log(f"{count} orders with {total_items} items")
+
+    def seed_ratings(self, count):
+        rng = self.rng
+        for batch in self.batches(count):
+            products = self.product_draw.draw(len(batch))
+            users = self.user_draw.draw(len(batch))
+            ratings = []
+            for position in range(len(batch)):
+                user_id = self.user_ids[users[position]]
+                created_at = self.past()
+                ratings.append(Rating(
+                    product_rating=rng.choices(*STARS)[0], store_rating=rng.choices(*STARS)[0],
+                    review=rng.choice(REVIEWS), product_reference_id=self.product_ids[products[position]],
+                    store_reference_id=self.product_store[products[position]], user_id=str(user_id),
+                    username=f'shopper{user_id}', created_at=created_at, updated_at=created_at,
+                ))
+            Rating.objects.bulk_create(ratings)
+        self.log(f"{count} ratings")
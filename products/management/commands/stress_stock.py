@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from products.models import Product
+from products.stock import InsufficientStock, reserve
+
+
+class Command(BaseCommand):
+    help = "Hammer one product with concurrent reservations and check that it is never oversold"
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('--stock', type=int, default=100, help="Stock to start the run with")
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=50, help="Reservations attempted by each worker")
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def handle(self, *args, **options):
+        product_id = options['product_id']
+        if not Product.objects.filter(id=product_id).update(stock=options['stock'], is_available=True):
+            raise CommandError(f"Product {product_id} does not exist")
+
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(options['attempts']):
+                try:
+                    with transaction.atomic():
+                        reserve([(product_id, None, options['quantity'])])
+                    outcome = 'reserved'
+                except InsufficientStock:
+                    outcome = 'out_of_stock'
+                except OperationalError:
+                    # SQLite reports lock timeouts as errors instead of waiting forever
+                    outcome = 'lock_timeout'
+                with lock:
+                    outcomes[outcome] += 1
+            connection.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        remaining = Product.objects.get(id=product_id).stock
+        sold = outcomes['reserved'] * options['quantity']
+        self.stdout.write(f"{dict(outcomes)} in {elapsed:.2f}s, {remaining} left")
+
+        if remaining < 0 or sold + remaining != options['stock']:
+            raise CommandError(f"Stock drifted: sold {sold} + remaining {remaining} != {options['stock']}")
+        self.stdout.write(self.style.SUCCESS("No overselling detected"))
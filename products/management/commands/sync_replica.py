@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db_router import REPLICA
+
+
+class Command(BaseCommand):
+    help = ("Copy the SQLite primary database into the replica file, once or every --interval seconds. "
+            "A local stand-in for replication, so replica routing can be tried without Postgres")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep copying with this many seconds between runs (the replication lag)")
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError("No replica database configured, set DATABASE_REPLICA_URL")
+        primary, replica = settings.DATABASES['default'], settings.DATABASES[REPLICA]
+        if not (primary['ENGINE'] == replica['ENGINE'] == 'django.db.backends.sqlite3'):
+            raise CommandError("sync_replica only copies SQLite files; use the database's own replication otherwise")
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError("The primary and the replica point at the same file")
+
+        while True:
+            started = time.perf_counter()
+            self.copy(primary['NAME'], replica['NAME'])
+            self.stdout.write(f"Replica synced in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path):
+        # The online backup API copies a consistent snapshot while the primary keeps taking writes
+        source = sqlite3.connect(source_path, timeout=5)
+        target = sqlite3.connect(target_path, timeout=5)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_total',
+            field=models.FloatField(default=0),
+        ),
+    ]
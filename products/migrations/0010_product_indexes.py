@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_stock'),
+        ('stores', '0010_store_rating_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['id'], name='product_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('discount__gt', 0)), fields=['id'], name='product_discounted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'brand', 'price'], name='product_cat_brand_price_idx'),
+        ),
+    ]
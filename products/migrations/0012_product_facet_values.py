@@ -0,0 +1,46 @@
+# Generated by Django 5.1 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TOKEN_FIELDS = ('color', 'capacity')
+
+
+def index_existing_products(apps, schema_editor):
+    # The same rows as products.facets.index_facets, written in batches
+    Product = apps.get_model('products', 'Product')
+    ProductFacetValue = apps.get_model('products', 'ProductFacetValue')
+
+    rows = []
+    for product in Product.objects.only('id', *TOKEN_FIELDS).iterator(chunk_size=2000):
+        for field in TOKEN_FIELDS:
+            values = [value.strip().lower() for value in (getattr(product, field) or '').split(',') if value.strip()]
+            rows += [ProductFacetValue(product_id=product.id, field=field, value=value)
+                     for value in dict.fromkeys(values)]
+        if len(rows) >= 5000:
+            ProductFacetValue.objects.bulk_create(rows)
+            rows = []
+    ProductFacetValue.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('color', 'Color'), ('capacity', 'Capacity')], max_length=20)),
+                ('value', models.CharField(max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_values', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('field', 'value', 'product'), name='product_facet_value_unique')],
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
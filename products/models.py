@@ -6,6 +6,7 @@ from django.db import models
 class Category(models.Model):
     title = models.CharField(max_length=255)
     imageUrl = models.URLField(blank=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.title
@@ -14,6 +15,7 @@ class Category(models.Model):
 class Brand(models.Model):
     title = models.CharField(max_length=256)
     imageUrl = models.URLField(blank=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -29,12 +31,14 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount = models.IntegerField(default=0)
     is_available = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(null=True, blank=True)  # Units left, null when stock isn't tracked
     description = models.TextField()
     is_featured = models.BooleanField(default=False)
     product_type = models.CharField(max_length=100)
     condition = models.CharField(max_length=50, choices=CONDITION_CHOICES, default=CONDITION_CHOICES[1])
     ratings = models.DecimalField(max_digits=3, decimal_places=2, default=3.0)
     rating_count = models.IntegerField(default=0)
+    rating_total = models.FloatField(default=0)  # Running sum of product ratings, kept with rating_count
     reviews = models.JSONField(blank=True)
     color = models.CharField(max_length=255)  # Storing list of colors
     image_urls = models.JSONField()  # Storing list of image URLs
@@ -42,6 +46,19 @@ class Product(models.Model):
     category = models.ForeignKey("Category", on_delete=models.CASCADE)
     brand = models.ForeignKey("Brand", on_delete=models.CASCADE)
     store_ref = models.ForeignKey('stores.Store', on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)  # Also touched when variations or accessories change
+
+    class Meta:
+        indexes = [
+            # Partial indexes only hold the rows the sampler and the discounts list read;
+            # backends without partial index support skip them
+            models.Index(fields=['id'], condition=models.Q(is_available=True), name='product_available_idx'),
+            models.Index(fields=['id'], condition=models.Q(discount__gt=0), name='product_discounted_idx'),
+            # Search filters on category, brand and a price range
+            models.Index(fields=['category', 'brand', 'price'], name='product_cat_brand_price_idx'),
+            # The all-stores validator reads the latest modification
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -67,6 +84,7 @@ class Variation(models.Model):
     color = models.CharField(max_length=50)
     title = models.CharField(max_length=255)
     is_available = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(null=True, blank=True)  # Units left, null when stock isn't tracked
     reference = models.ForeignKey('Product', related_name='variations', on_delete=models.CASCADE)  # Link to one product
     capacity = models.CharField(max_length=50)
     condition = models.CharField(max_length=50, choices=CONDITION_CHOICES, default=CONDITION_CHOICES[1])
@@ -75,3 +93,23 @@ class Variation(models.Model):
 
     def __str__(self):
         return f"{self.title} ({self.color}, {self.capacity})"
+
+
+class ProductFacetValue(models.Model):
+    """One entry of a product's comma separated color or capacity list, lowercased, for the facet filters."""
+    FIELD_CHOICES = [
+        ('color', 'Color'),
+        ('capacity', 'Capacity'),
+    ]
+    product = models.ForeignKey('Product', related_name='facet_values', on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            # Also the index the filters look the products of a value up in
+            models.UniqueConstraint(fields=['field', 'value', 'product'], name='product_facet_value_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.field}={self.value}"
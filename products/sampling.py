@@ -0,0 +1,73 @@
+import random
+import threading
+import time
+
+from products.models import Product
+
+
+class ProductSampler:
+    """
+    Keeps a compact array of available product IDs so random picks never
+    have to touch the whole product table.
+
+    The array is loaded lazily, kept in sync by the product signals and
+    rebuilt every `refresh_interval` seconds to pick up writes made by other
+    worker processes.
+    """
+
+    def __init__(self, refresh_interval=300):
+        self.refresh_interval = refresh_interval
+        self._ids = []
+        self._positions = {}  # product id -> index in self._ids
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def rebuild(self, ids=None):
+        # Only the IDs are pulled from the database, never full rows
+        if ids is None:
+            ids = Product.objects.filter(is_available=True).values_list('id', flat=True).iterator()
+
+        ids = list(ids)
+        with self._lock:
+            self._ids = ids
+            self._positions = {product_id: index for index, product_id in enumerate(ids)}
+            self._loaded_at = time.monotonic()
+
+    def add(self, product_id):
+        with self._lock:
+            if self._loaded_at is None or product_id in self._positions:
+                return
+            self._positions[product_id] = len(self._ids)
+            self._ids.append(product_id)
+
+    def remove(self, product_id):
+        with self._lock:
+            index = self._positions.pop(product_id, None)
+            if index is None:
+                return
+
+            # Swap the last ID into the hole so removal stays O(1)
+            last_id = self._ids.pop()
+            if last_id != product_id:
+                self._ids[index] = last_id
+                self._positions[last_id] = index
+
+    def sample(self, k):
+        if self._is_stale():
+            self.rebuild()
+
+        with self._lock:
+            if k >= len(self._ids):
+                ids = list(self._ids)
+                random.shuffle(ids)
+                return ids
+            return random.sample(self._ids, k)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+product_sampler = ProductSampler()
@@ -0,0 +1,208 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from products.models import Product
+
+FTS_TABLE = 'products_product_fts'
+
+# Must match the expression of the GIN index created in the search index migration
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(p.title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(p.product_type, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(p.description, '')), 'C')"
+)
+
+
+def search_terms(text):
+    # Only keep word characters so user input can never break the index query syntax
+    return re.findall(r'\w+', text or '')
+
+
+class BaseSearchBackend:
+    """
+    Runs ranked product searches inside the database index.
+
+    `search` returns product IDs ordered by relevance, with the price,
+    category and brand filters applied in the same query. Only the best
+    `max_results` matches are returned; ProductSearchView reports the cap
+    in its X-Search-Limit and X-Search-Truncated headers.
+    """
+
+    max_results = 500
+
+    def search(self, text, filters=None):
+        terms = search_terms(text)
+        if not terms:
+            return []
+
+        where, params = self._filter_clauses(filters or {})
+        return self._search(terms, where, params)
+
+    def _search(self, terms, where, params):
+        raise NotImplementedError
+
+    def match(self, text):
+        """A Product condition for every match of `text`, unranked and without the `max_results` cap."""
+        terms = search_terms(text)
+        if not terms:
+            return Q(pk__in=[])
+        return self._match(terms)
+
+    def _match(self, terms):
+        raise NotImplementedError
+
+    def _filter_clauses(self, filters):
+        where = []
+        params = []
+
+        for key, clause, cast in (
+            ('min_price', 'p.price >= %s', Decimal),
+            ('max_price', 'p.price <= %s', Decimal),
+            ('category', 'p.category_id = %s', int),
+            ('brand', 'p.brand_id = %s', int),
+        ):
+            value = filters.get(key)
+            if value in (None, ''):
+                continue
+            try:
+                params.append(cast(value))
+            except (ValueError, TypeError, InvalidOperation):
+                continue
+            where.append(clause)
+
+        return where, params
+
+    def index_product(self, product):
+        pass
+
+    def index_products(self, products):
+        for product in products:
+            self.index_product(product)
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """FTS5 virtual table keyed by product id, kept up to date by the product signals."""
+
+    @staticmethod
+    def _match_query(terms):
+        # Prefix-match every term so results follow the app's search-as-you-type box
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def _search(self, terms, where, params):
+        match = self._match_query(terms)
+        sql = (
+            f"SELECT p.id FROM {FTS_TABLE} f JOIN products_product p ON p.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s {''.join(' AND ' + clause for clause in where)} "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *params, self.max_results])
+            return [row[0] for row in cursor.fetchall()]
+
+    def _match(self, terms):
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        return Q(id__in=RawSQL(sql, [self._match_query(terms)]))
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, product_type, description) VALUES (%s, %s, %s, %s)",
+                [product.id, product.title, product.product_type, product.description],
+            )
+
+    def index_products(self, products):
+        # Used by bulk imports, which skip the per-product signals
+        rows = [(product.id, product.title, product.product_type, product.description) for product in products]
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [row[:1] for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, product_type, description) VALUES (%s, %s, %s, %s)", rows
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, product_type, description) "
+                f"SELECT id, title, product_type, description FROM products_product"
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector search served by a GIN expression index, so no separate sync is needed."""
+
+    @staticmethod
+    def _tsquery(terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def _search(self, terms, where, params):
+        query = self._tsquery(terms)
+        sql = (
+            f"SELECT p.id FROM products_product p, to_tsquery('simple', %s) q "
+            f"WHERE ({POSTGRES_DOCUMENT}) @@ q {''.join(' AND ' + clause for clause in where)} "
+            f"ORDER BY ts_rank({POSTGRES_DOCUMENT}, q) DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [query, *params, self.max_results])
+            return [row[0] for row in cursor.fetchall()]
+
+    def _match(self, terms):
+        sql = f"SELECT p.id FROM products_product p WHERE ({POSTGRES_DOCUMENT}) @@ to_tsquery('simple', %s)"
+        return Q(id__in=RawSQL(sql, [self._tsquery(terms)]))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX products_product_search_idx")
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """Fallback for databases without a full-text index; matches the old `icontains` filter."""
+
+    def search(self, text, filters=None):
+        terms = search_terms(text)
+        if not terms:
+            return []
+
+        queryset = Product.objects.filter(title__icontains=text)
+        for key, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte'),
+                            ('category', 'category_id'), ('brand', 'brand_id')):
+            value = (filters or {}).get(key)
+            if value not in (None, ''):
+                queryset = queryset.filter(**{lookup: value})
+        return list(queryset.values_list('id', flat=True)[:self.max_results])
+
+    def match(self, text):
+        if not search_terms(text):
+            return Q(pk__in=[])
+        return Q(title__icontains=text)
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    # Allow the backend to be swapped from settings, otherwise pick one for the database in use
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(connection.vendor, IContainsSearchBackend)()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from core.fieldsets import SparseFieldsMixin
 from products.models import Product, Accessory, Variation, Category, Brand
 from stores.models import Store
 from stores.serializers import StoreBasicSerializer
@@ -14,10 +15,10 @@ class AccessorySerializer(serializers.ModelSerializer):
 class VariationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Variation
-        fields = ['id', 'title', 'color', 'capacity', 'reference', 'price', 'image_url']
+        fields = ['id', 'title', 'color', 'capacity', 'reference', 'price', 'stock', 'image_url']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     accessories = AccessorySerializer(many=True, read_only=True)
     variations = VariationSerializer(many=True, read_only=True)
     store_ref = StoreBasicSerializer(read_only=True)
@@ -25,10 +26,26 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'price', 'description', 'is_available', 'discount', 'is_featured', 'product_type',
+            'id', 'title', 'price', 'description', 'is_available', 'stock', 'discount', 'is_featured', 'product_type',
             'condition', 'ratings', 'rating_count', 'reviews', 'color', 'image_urls',
             'capacity', 'category', 'brand', 'accessories', 'variations', 'store_ref'
         ]
+        expandable_fields = ['accessories', 'variations', 'store_ref']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fieldset=None):
+        # Load the store, variations and accessories with the product rather than one query each,
+        # and with a fieldset only the columns and relations it outputs
+        if fieldset is None:
+            return queryset.select_related('store_ref').prefetch_related(*cls.prefetch_lookups())
+        queryset = queryset.only(*cls.only_columns(fieldset))
+        if 'store_ref' in fieldset:
+            queryset = queryset.select_related('store_ref')
+        return queryset.prefetch_related(*cls.prefetch_lookups(fieldset))
+
+    @staticmethod
+    def prefetch_lookups(fieldset=None):
+        return [name for name in ('accessories', 'variations') if fieldset is None or name in fieldset]
 
 class AddProductSerializer(serializers.ModelSerializer):
     accessories = AccessorySerializer(many=True, read_only=True)
@@ -38,7 +55,7 @@ class AddProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'price', 'description', 'is_available','discount', 'is_featured', 'product_type',
+            'id', 'title', 'price', 'description', 'is_available', 'stock', 'discount', 'is_featured', 'product_type',
             'condition', 'ratings', 'rating_count', 'reviews', 'color', 'image_urls',
             'capacity', 'category', 'brand', 'accessories', 'variations', 'store_ref'
         ]
@@ -77,3 +94,39 @@ class ProductListSerializer(serializers.ModelSerializer):
             'condition', 'ratings', 'rating_count', 'image_urls',
             'capacity', 'category', 'brand',
         ]
+
+
+class StockLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    variation_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    # Related rows are given by id or title and resolved by the importer from preloaded maps
+    category = serializers.CharField()
+    brand = serializers.CharField()
+    store_ref = serializers.IntegerField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'title', 'price', 'description', 'is_available', 'stock', 'discount', 'is_featured', 'product_type',
+            'condition', 'reviews', 'color', 'image_urls', 'capacity', 'category', 'brand', 'store_ref'
+        ]
+
+
+class VariationImportSerializer(serializers.ModelSerializer):
+    reference = serializers.IntegerField()
+
+    class Meta:
+        model = Variation
+        fields = ['title', 'color', 'capacity', 'condition', 'is_available', 'stock', 'reference', 'price', 'image_url']
+
+
+class AccessoryImportSerializer(serializers.ModelSerializer):
+    reference = serializers.IntegerField()
+
+    class Meta:
+        model = Accessory
+        fields = ['title', 'reference', 'price', 'image_url']
@@ -0,0 +1,86 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products.cache import (catalogue_cache, HOME_CATEGORIES, CATEGORIES, BRANDS, PRODUCT_LIST_NAMESPACES,
+                            single_product_namespace, store_namespace)
+from products.facets import TOKEN_FIELDS, index_facets
+from products.models import Accessory, Brand, Category, Product, Variation
+from products.sampling import product_sampler
+from products.search import get_search_backend
+from products.similarity import similar_products_index
+from stores.models import Store
+
+
+def loaded_facet_fields(product):
+    # Read from __dict__ so deferred fields are never loaded; None when one wasn't loaded
+    values = tuple(product.__dict__.get(field) for field in TOKEN_FIELDS)
+    return None if None in values else values
+
+
+@receiver(post_init, sender=Product)
+def remember_facet_fields(sender, instance, **kwargs):
+    # Keep the loaded color and capacity so a later save can tell whether the facets changed
+    instance._facet_fields = loaded_facet_fields(instance)
+
+
+@receiver(post_save, sender=Product)
+def sync_product_indexes_on_save(sender, instance, **kwargs):
+    # Keep the random sampling pool in step with product availability
+    if instance.is_available:
+        product_sampler.add(instance.id)
+    else:
+        product_sampler.remove(instance.id)
+
+    similar_products_index.update(instance)
+    get_search_backend().index_product(instance)
+
+    # Deferred fields aren't saved, so only loaded lists that changed are indexed again
+    facet_fields = loaded_facet_fields(instance)
+    if kwargs['created'] or (facet_fields is not None and facet_fields != instance._facet_fields):
+        index_facets([instance], replace=not kwargs['created'])
+        instance._facet_fields = facet_fields
+
+
+@receiver(post_delete, sender=Product)
+def sync_product_indexes_on_delete(sender, instance, **kwargs):
+    product_sampler.remove(instance.id)
+    similar_products_index.remove(instance.id)
+    get_search_backend().remove_product(instance.id)
+
+
+@receiver(post_delete, sender=Product)
+def touch_store_on_product_delete(sender, instance, **kwargs):
+    # The all-stores validator doesn't count products, so a removal has to move its store's modification time
+    Store.objects.filter(id=instance.store_ref_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    catalogue_cache.invalidate(single_product_namespace(instance.id), *PRODUCT_LIST_NAMESPACES)
+
+
+@receiver([post_save, post_delete], sender=Variation)
+@receiver([post_save, post_delete], sender=Accessory)
+def invalidate_product_extras_cache(sender, instance, **kwargs):
+    # Variations and accessories are only nested in the single product payload
+    catalogue_cache.invalidate(single_product_namespace(instance.reference_id))
+
+    # Move the product's modification time so conditional requests see the change
+    Product.objects.filter(id=instance.reference_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    catalogue_cache.invalidate(HOME_CATEGORIES, CATEGORIES)
+
+
+@receiver([post_save, post_delete], sender=Brand)
+def invalidate_brand_cache(sender, instance, **kwargs):
+    catalogue_cache.invalidate(BRANDS)
+
+
+@receiver(post_save, sender=Store)
+def invalidate_store_products_cache(sender, instance, **kwargs):
+    # The store summary is nested in every single product payload of the store, which depend on its namespace
+    catalogue_cache.invalidate(store_namespace(instance.id))
@@ -0,0 +1,105 @@
+import bisect
+import threading
+import time
+from itertools import islice
+
+from products.models import Product
+
+# Upper bounds of the price bands used to group comparable products
+PRICE_BANDS = [100, 250, 500, 1000, 2000, 5000]
+
+
+def price_band(price):
+    return bisect.bisect_left(PRICE_BANDS, float(price))
+
+
+def _match_levels(brand_id, band, product_type):
+    # Bucket keys from the closest match to the loosest, used as the ranking order
+    return [
+        (brand_id, band, product_type),
+        (None, band, product_type),
+        (brand_id, None, product_type),
+        (None, None, product_type),
+        (brand_id, None, None),
+        (None, None, None),
+    ]
+
+
+class SimilarProductsIndex:
+    """
+    Per-category index of products bucketed by brand, price band and product type.
+
+    A lookup walks a fixed number of buckets from the closest match to the loosest
+    and stops once it has enough neighbours, so it never scans the category.
+    Categories are loaded on first use, updated by the product signals and
+    reloaded every `refresh_interval` seconds.
+    """
+
+    def __init__(self, refresh_interval=300):
+        self.refresh_interval = refresh_interval
+        self._buckets = {}  # category id -> {bucket key -> {product id: None}}
+        self._keys = {}  # product id -> (category id, bucket keys)
+        self._loaded_at = {}  # category id -> load time
+        self._lock = threading.Lock()
+
+    def _load_category(self, category_id):
+        rows = Product.objects.filter(category_id=category_id).values_list(
+            'id', 'brand_id', 'price', 'product_type'
+        ).order_by('id')
+
+        with self._lock:
+            self._drop_category(category_id)
+            self._buckets[category_id] = {}
+            for product_id, brand_id, price, product_type in rows.iterator():
+                self._insert(product_id, category_id, brand_id, price, product_type)
+            self._loaded_at[category_id] = time.monotonic()
+
+    def _drop_category(self, category_id):
+        for bucket in self._buckets.pop(category_id, {}).values():
+            for product_id in bucket:
+                self._keys.pop(product_id, None)
+        self._loaded_at.pop(category_id, None)
+
+    def _insert(self, product_id, category_id, brand_id, price, product_type):
+        keys = _match_levels(brand_id, price_band(price), product_type)
+        buckets = self._buckets[category_id]
+        for key in keys:
+            buckets.setdefault(key, {})[product_id] = None
+        self._keys[product_id] = (category_id, keys)
+
+    def _discard(self, product_id):
+        category_id, keys = self._keys.pop(product_id, (None, ()))
+        buckets = self._buckets.get(category_id, {})
+        for key in keys:
+            buckets.get(key, {}).pop(product_id, None)
+
+    def update(self, product):
+        with self._lock:
+            self._discard(product.id)
+            # Categories that have not been loaded yet will pick the product up when they are
+            if product.category_id in self._buckets:
+                self._insert(product.id, product.category_id, product.brand_id, product.price, product.product_type)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._discard(product_id)
+
+    def neighbours(self, category_id, product_id=None, limit=6):
+        loaded_at = self._loaded_at.get(category_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_interval:
+            self._load_category(category_id)
+
+        with self._lock:
+            buckets = self._buckets.get(category_id, {})
+            _, keys = self._keys.get(product_id, (None, [(None, None, None)]))
+
+            found = {}
+            for key in keys:
+                candidates = (pid for pid in buckets.get(key, {}) if pid != product_id and pid not in found)
+                found.update(dict.fromkeys(islice(candidates, limit - len(found))))
+                if len(found) >= limit:
+                    break
+            return list(found)
+
+
+similar_products_index = SimilarProductsIndex()
@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from products.cache import catalogue_cache, single_product_namespace
+from products.models import Product, Variation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, unavailable):
+        super().__init__("Insufficient stock")
+        self.unavailable = unavailable  # Availability rows of the lines that cannot be fulfilled
+
+
+def _group(lines):
+    # Total quantity per product and per variation; lines with a variation draw from the variation's stock
+    products = defaultdict(int)
+    variations = defaultdict(int)
+    for product_id, variation_id, quantity in lines:
+        if variation_id:
+            variations[variation_id] += quantity
+        else:
+            products[product_id] += quantity
+    return products, variations
+
+
+def _reserve_rows(model, quantities, **extra_updates):
+    if not quantities:
+        return True
+
+    # A single conditional UPDATE: rows only change when they are available and have enough stock left,
+    # and the database row locks it takes serialise concurrent checkouts without locking the table
+    needed = Case(*[When(id=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                  output_field=IntegerField())
+    updated = model.objects.filter(id__in=quantities, is_available=True).filter(
+        Q(stock__isnull=True) | Q(stock__gte=needed)
+    ).update(stock=F('stock') - needed, **extra_updates)
+    return updated == len(quantities)
+
+
+def check_availability(lines):
+    """
+    Availability, stock and price of each (product_id, variation_id, quantity) line.
+
+    Products and variations are each loaded with one query, whatever the number of lines.
+    """
+    lines = list(lines)
+    products_needed, variations_needed = _group(lines)
+
+    fields = ('id', 'is_available', 'stock', 'price')
+    products = Product.objects.only(*fields, 'discount').in_bulk({line[0] for line in lines})
+    variations = Variation.objects.only(*fields).in_bulk(list(variations_needed))
+
+    results = []
+    for product_id, variation_id, quantity in lines:
+        product = products.get(product_id)
+        source = variations.get(variation_id) if variation_id else product
+        needed = variations_needed[variation_id] if variation_id else products_needed[product_id]
+
+        if product is None or source is None:
+            results.append({'product_id': product_id, 'variation_id': variation_id, 'quantity': quantity,
+                            'found': False, 'is_available': False, 'in_stock': False})
+            continue
+
+        results.append({
+            'product_id': product_id,
+            'variation_id': variation_id,
+            'quantity': quantity,
+            'found': True,
+            'is_available': source.is_available,
+            'in_stock': source.is_available and (source.stock is None or source.stock >= needed),
+            'stock': source.stock,
+            'price': str(source.price),
+            'discount': product.discount,
+        })
+    return results
+
+
+def reserve(lines):
+    """
+    Take the quantities of (product_id, variation_id, quantity) lines out of stock.
+
+    Either every line is reserved or none is, in which case InsufficientStock lists the failing lines.
+    """
+    lines = list(lines)
+    products_needed, variations_needed = _group(lines)
+    now = timezone.now()
+
+    # Run inside a savepoint so a partial reservation never survives a failure
+    with transaction.atomic():
+        reserved = (_reserve_rows(Product, products_needed, updated_at=now)
+                    and _reserve_rows(Variation, variations_needed))
+        if not reserved:
+            transaction.set_rollback(True)
+        elif variations_needed:
+            Product.objects.filter(variations__id__in=list(variations_needed)).update(updated_at=now)
+
+    if not reserved:
+        raise InsufficientStock([row for row in check_availability(lines) if not row['in_stock']])
+
+    # The stock is part of the cached product payloads
+    product_ids = {line[0] for line in lines}
+    transaction.on_commit(lambda: catalogue_cache.invalidate(*map(single_product_namespace, product_ids)))
@@ -1,3 +1,658 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import uuid
+from base64 import b64decode
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from address.models import Address
+from core.compiled import compile_serializer
+from core.renderers import ORJSONRenderer
+from orders.models import Order, OrderItem
+from products.cache import catalogue_cache
+from products.facets import split_tokens, token_filter
+from products.importer import CatalogueImporter, read_rows
+from products.management.commands.bench_serializers import serializer_cases
+from products.models import Brand, Category, Product, Variation
+from products.search import BaseSearchBackend
+from products.serializers import ProductSerializer
+from products.sampling import ProductSampler, product_sampler
+from products.similarity import SimilarProductsIndex
+from products.stock import InsufficientStock, reserve
+from ratings.models import Rating
+from ratings.serializers import RatingSerializer
+from stores.models import Store, StoreDailySales, StoreOrder
+
+
+def make_store(**fields):
+    owner = User.objects.first() or User.objects.create_user('owner', password='secret')
+    return Store.objects.create(**{
+        'title': 'Store', 'address': 'Main street', 'coverUrl': 'https://example.com/cover.png',
+        'opening_hours': {}, 'owner': owner, **fields,
+    })
+
+
+def make_product(store, category, brand, **fields):
+    return Product.objects.create(**{
+        'title': 'Phone', 'price': Decimal('100.00'), 'description': 'A phone', 'product_type': 'phone',
+        'reviews': [], 'color': 'black', 'image_urls': [], 'capacity': '64gb',
+        'category': category, 'brand': brand, 'store_ref': store, **fields,
+    })
+
+
+class CatalogueTestCase(TestCase):
+    """A store, a category and a brand, with the process-wide caches and indexes reset."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        catalogue_cache.local.clear()
+
+        self.store = make_store()
+        self.category = Category.objects.create(title='Phones', imageUrl='https://example.com/phones.png')
+        self.brand = Brand.objects.create(title='Acme', imageUrl='https://example.com/acme.png')
+        product_sampler.rebuild([])
+
+    def product(self, **fields):
+        return make_product(self.store, self.category, self.brand, **fields)
+
+
+class ProductSamplerTests(TestCase):
+    def test_sample_is_distinct_and_follows_removals(self):
+        sampler = ProductSampler()
+        sampler.rebuild(range(1, 101))
+
+        sample = sampler.sample(10)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(set(sample) <= set(range(1, 101)))
+
+        for product_id in range(1, 96):
+            sampler.remove(product_id)
+        sampler.add(500)
+        self.assertCountEqual(sampler.sample(20), [96, 97, 98, 99, 100, 500])
+
+
+class RecommendationsTests(CatalogueTestCase):
+    def test_only_available_products_are_recommended(self):
+        available = [self.product(title=f'Phone {index}') for index in range(3)]
+        self.product(title='Sold out', is_available=False)
+
+        product_sampler.rebuild()
+        response = self.client.get('/api/products/recommendations')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([product['id'] for product in response.json()], [product.id for product in available])
+
+
+class SimilarProductsTests(CatalogueTestCase):
+    def test_closest_buckets_rank_first(self):
+        other_brand = Brand.objects.create(title='Other', imageUrl='https://example.com/other.png')
+        product = self.product(price=Decimal('150'))
+        same_band = self.product(title='Same band', price=Decimal('180'))
+        other_band = self.product(title='Other band', price=Decimal('900'))
+        other_brand_product = make_product(self.store, self.category, other_brand, price=Decimal('150'))
+        laptop = self.product(title='Laptop', price=Decimal('150'), product_type='laptop')
+
+        index = SimilarProductsIndex()
+        self.assertEqual(index.neighbours(self.category.id, product.id, limit=4),
+                         [same_band.id, other_brand_product.id, other_band.id, laptop.id])
+
+    def test_endpoint_excludes_the_product_itself(self):
+        product = self.product()
+        neighbour = self.product(title='Neighbour')
+
+        response = self.client.get('/api/products/similar-products',
+                                   {'category': self.category.id, 'product_id': product.id})
+        self.assertEqual([item['id'] for item in response.json()], [neighbour.id])
+
+
+class ProductSearchTests(CatalogueTestCase):
+    def test_title_matches_are_ranked_and_filtered(self):
+        self.product(title='Galaxy phone', price=Decimal('300'))
+        cheap = self.product(title='Galaxy lite', price=Decimal('50'))
+        self.product(title='Pixel')
+
+        response = self.client.get('/api/products/search', {'title': 'gala', 'max_price': '100'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['id'] for product in response.json()], [cheap.id])
+        self.assertEqual(response['X-Search-Truncated'], 'false')
+
+    def test_blank_title_is_ignored(self):
+        product = self.product()
+
+        for params in ({'title': ' '}, {'title': ' ', 'cursor': ''}):
+            response = self.client.get('/api/products/search', params)
+            self.assertEqual(response.status_code, 200)
+            rows = response.json()
+            rows = rows['results'] if 'cursor' in params else rows
+            self.assertEqual([row['id'] for row in rows], [product.id])
+            self.assertNotIn('X-Search-Limit', response)
+
+    def test_capped_searches_are_reported(self):
+        for index in range(3):
+            self.product(title=f'Galaxy {index}')
+
+        with mock.patch.object(BaseSearchBackend, 'max_results', 2):
+            response = self.client.get('/api/products/search', {'title': 'galaxy'})
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(response['X-Search-Limit'], '2')
+        self.assertEqual(response['X-Search-Truncated'], 'true')
+
+    def test_cursor_pages_through_tied_prices(self):
+        products = [self.product(title=f'Phone {index}', price=Decimal(100 + index // 3)) for index in range(7)]
+        expected = [product.id for product in sorted(products, key=lambda product: (-product.price, -product.id))]
+
+        url, params, seen, links = '/api/products/search', {'cursor': '', 'page_size': 2}, [], []
+        while url:
+            page = self.client.get(url, params).json()
+            seen += [product['id'] for product in page['results']]
+            url, params = page['next'], None
+            links += [page['next'], page['previous']]
+        self.assertEqual(seen, expected)
+
+        # Each cursor seeks on (price, id), so none needs an offset into the tied rows
+        cursors = [parse_qs(urlsplit(link).query)['cursor'][0] for link in links if link]
+        self.assertFalse([cursor for cursor in cursors if 'o' in parse_qs(b64decode(cursor).decode())])
+        previous = self.client.get(links[-1]).json()
+        self.assertEqual(len(cursors), 6)
+        self.assertEqual([product['id'] for product in previous['results']], expected[-3:-1])
+
+
+class ProductCacheTests(CatalogueTestCase):
+    def test_equivalent_ids_share_the_invalidation(self):
+        product = self.product()
+        self.assertEqual(self.client.get('/api/products/singles', {'product_id': '01'}).json()['title'], 'Phone')
+
+        product.title = 'Renamed'
+        product.save()
+        catalogue_cache.local.clear()
+        self.assertEqual(self.client.get('/api/products/singles', {'product_id': '01'}).json()['title'], 'Renamed')
+
+    def test_invalid_ids_are_rejected(self):
+        for product_id in ('abc', '1.5', ''):
+            response = self.client.get('/api/products/singles', {'product_id': product_id})
+            self.assertEqual(response.status_code, 400)
+
+    def test_store_save_refreshes_single_and_batch_payloads(self):
+        products = [self.product(), self.product(title='Tablet')]
+        ids = ','.join(str(product.id) for product in products)
+        self.client.get('/api/products/singles', {'product_id': products[0].id})
+        self.client.get('/api/products/batch', {'ids': ids})
+
+        self.store.title = 'Renamed store'
+        with self.assertNumQueries(1):
+            # Only the store update, whatever the number of its products
+            self.store.save()
+
+        # Another worker's local entries expire, its shared entries are checked against the store version
+        catalogue_cache.local.clear()
+        single = self.client.get('/api/products/singles', {'product_id': products[0].id}).json()
+        self.assertEqual(single['store_ref']['title'], 'Renamed store')
+        batch = self.client.get('/api/products/batch', {'ids': ids}).json()
+        self.assertEqual([product['store_ref']['title'] for product in batch], ['Renamed store'] * 2)
+
+    def test_store_save_drops_local_entries(self):
+        product = self.product()
+        self.client.get('/api/products/singles', {'product_id': product.id})
+
+        self.store.title = 'Renamed store'
+        self.store.save()
+        single = self.client.get('/api/products/singles', {'product_id': product.id}).json()
+        self.assertEqual(single['store_ref']['title'], 'Renamed store')
+
+
+class KeysetPaginationTests(CatalogueTestCase):
+    def test_cursor_pages_follow_the_ordering_without_counting(self):
+        products = [self.product(title=f'Phone {index}') for index in range(25)]
+
+        url, params, seen = '/api/products/category-products-list', {'category_id': self.category.id, 'cursor': ''}, []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url, params).json()
+            self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+            self.assertNotIn('count', page)
+            seen += [product['id'] for product in page['results']]
+            url, params = page['next'], None
+        self.assertEqual(seen, [product.id for product in products])
+
+    def test_requests_without_cursor_keep_page_numbers(self):
+        for index in range(12):
+            self.product(title=f'Phone {index}')
+
+        page = self.client.get('/api/products/category-products-list',
+                               {'category_id': self.category.id, 'page': 2}).json()
+        self.assertEqual(page['count'], 12)
+        self.assertEqual(len(page['results']), 2)
+
+
+class ConditionalProductTests(CatalogueTestCase):
+    def test_single_product_is_revalidated_against_its_variations(self):
+        product = self.product()
+        response = self.client.get('/api/products/singles', {'product_id': product.id})
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/singles', {'product_id': product.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        Variation.objects.create(reference=product, color='red', title='Red', capacity='64gb', price=100,
+                                 image_url='https://example.com/v.png')
+        response = self.client.get('/api/products/singles', {'product_id': product.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['variations']), 1)
+
+
+class SerializerParityTests(CatalogueTestCase):
+    """The compiled serializers and the orjson renderer against the ModelSerializers and DRF's JSONRenderer."""
+
+    def setUp(self):
+        super().setUp()
+        products = [self.product(title=f'Phone {index} caf\u00e9 \u2028', price=Decimal('99.90') + index,
+                                 discount=index * 5) for index in range(3)]
+        order = Order.objects.create(user='7', total_price=100, delivery_price=10)
+        for product_rating, review in [(5, 'Good "value"'), (4.5, 'Fine \\ okay'), (0.1, '\U0001f600')]:
+            Rating.objects.create(product_rating=product_rating, store_rating=3.25, review=review, user_id='7',
+                                  product_reference=products[0], store_reference=self.store, order_reference=order)
+        Address.objects.create(user='7', phone_number='0700000000', address='1 Main St', city='Nairobi',
+                               contact_name='Ann', is_default=True)
+        Address.objects.create(user='7', phone_number='0700000001', address='2 Side St', city='Mombasa',
+                               contact_name='Ann', tag='Work')
+
+    def test_compiled_lists_render_identically(self):
+        for name, serializer_class, queryset in serializer_cases():
+            with self.subTest(name):
+                compiled = compile_serializer(serializer_class)
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                self.assertNotEqual(expected, b'[]')
+                self.assertEqual(ORJSONRenderer().render(compiled.serialize(compiled.values(queryset))), expected)
+
+    def test_renderer_matches_the_stdlib_encoder(self):
+        # Values the encoders treat differently, around the shapes the API returns
+        now = timezone.now()
+        payload = {
+            'results': [
+                {'id': 1, 'price': Decimal('12.50'), 'created_at': now, 'naive': now.replace(tzinfo=None)},
+                {'id': 2, 'day': now.date(), 'time': now.time(), 'duration': timedelta(minutes=90)},
+            ],
+            'uuid': uuid.uuid4(),
+            'lazy': gettext_lazy("Not found."),
+            'text': 'caf\u00e9 \u2028\u2029 "quoted" \\ \x01 \U0001f600',
+            'floats': [0.1, 4.5, -0.0, 1e15],
+            'nested': ({'a': None, 'b': True}, [1, [2, [3]]]),
+            'count': 2 ** 63,
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_non_finite_floats_are_refused(self):
+        Rating.objects.filter(review='Good "value"').update(product_rating=float('inf'))
+        compiled = compile_serializer(RatingSerializer)
+        data = compiled.serialize(compiled.values(Rating.objects.order_by('-id')))
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            with self.subTest(type(renderer).__name__), self.assertRaises(ValueError):
+                renderer.render(data)
+
+
+class SparseFieldsetTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product_id = self.product().id
+        Variation.objects.create(reference_id=self.product_id, color='red', title='Red', capacity='64gb', price=100,
+                                 image_url='https://example.com/v.png')
+
+    def single(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/singles', {'product_id': self.product_id, **params})
+        # The first query is the conditional-response validator
+        return response, [query['sql'] for query in queries.captured_queries[1:]]
+
+    def test_fields_narrow_the_output_and_the_query(self):
+        response, full = self.single()
+        self.assertEqual(list(response.json())[-3:], ['accessories', 'variations', 'store_ref'])
+        self.assertEqual(len(full), 3)
+
+        # In declaration order whatever the order asked for, and not the cached full payload
+        response, queries = self.single(fields='price,id,title')
+        self.assertEqual(list(response.json()), ['id', 'title', 'price'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0])
+        self.assertNotIn('JOIN', queries[0])
+
+    def test_expand_loads_only_the_named_relations(self):
+        response, queries = self.single(expand='variations')
+        data = response.json()
+        self.assertEqual(len(data['variations']), 1)
+        self.assertNotIn('accessories', data)
+        self.assertNotIn('store_ref', data)
+        self.assertIn('description', data)
+        self.assertEqual(len(queries), 2)
+
+        response, queries = self.single(fields='id', expand='store_ref')
+        data = response.json()
+        self.assertEqual(list(data), ['id', 'store_ref'])
+        self.assertEqual(data['store_ref']['id'], self.store.id)
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_names_are_rejected(self):
+        response, _ = self.single(fields='store_ref')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ["'store_ref' is a relation, request it with expand."]})
+
+        response, _ = self.single(fields='nope', expand='title')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+
+    def test_only_columns(self):
+        fieldset = ProductSerializer.select_fields(['title', 'category'], ['store_ref', 'variations'])
+        self.assertEqual(fieldset, ['title', 'category', 'variations', 'store_ref'])
+        # Reverse relations have no column; the primary key is always loaded
+        self.assertEqual(ProductSerializer.only_columns(fieldset, required=['-updated_at']),
+                         ['id', 'updated_at', 'title', 'category', 'store_ref'])
+        self.assertIsNone(ProductSerializer.select_fields())
+
+
+class ProductBatchTests(CatalogueTestCase):
+    def stocked_products(self, count):
+        products = []
+        for index in range(count):
+            product = self.product(title=f'Phone {index}')
+            Variation.objects.create(reference=product, color='red', title='Red', capacity='64gb', price=100,
+                                     image_url='https://example.com/v.png')
+            products.append(product)
+        return products
+
+    def batch(self, ids, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/batch', {'ids': ','.join(map(str, ids)), **params})
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_ids(self):
+        products = self.stocked_products(10)
+        # The products with their stores, then accessories and variations, whatever the number of products
+        response, one = self.batch([products[0].id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(one, 3)
+
+        catalogue_cache.local.clear()
+        caches['default'].clear()
+        response, many = self.batch([product.id for product in products])
+        self.assertEqual(len(response.json()), 10)
+        self.assertEqual(many, one)
+
+        # Cached payloads cost no query; only the missing products are loaded
+        _, cached = self.batch([product.id for product in products])
+        self.assertEqual(cached, 0)
+        extra = self.stocked_products(2)
+        response, partial = self.batch([product.id for product in products + extra])
+        self.assertEqual(len(response.json()), 12)
+        self.assertEqual(partial, 3)
+
+        response, sparse = self.batch([product.id for product in products], fields='id,title')
+        self.assertEqual(list(response.json()[0]), ['id', 'title'])
+        self.assertEqual(sparse, 1)
+
+    def test_order_and_payload_follow_singles(self):
+        first, second = self.stocked_products(2)
+        response, _ = self.batch([second.id, first.id, second.id, 10 ** 6])
+        data = response.json()
+        self.assertEqual([product['id'] for product in data], [second.id, first.id])
+
+        single = self.client.get('/api/products/singles', {'product_id': first.id}).json()
+        self.assertEqual(data[1], single)
+
+        # Saving a product drops the payload both endpoints share
+        first.title = 'Renamed'
+        first.save()
+        response, _ = self.batch([first.id])
+        self.assertEqual(response.json()[0]['title'], 'Renamed')
+
+    def test_invalid_ids(self):
+        for ids in ['', 'a,1', ','.join(map(str, range(1, 102)))]:
+            with self.subTest(ids=ids[:10]):
+                response = self.client.get('/api/products/batch', {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+
+
+class StockAvailabilityTests(CatalogueTestCase):
+    def check(self, data):
+        return self.client.post('/api/products/check-availability/bulk', data, content_type='application/json')
+
+    def test_lines_are_checked_against_the_stock(self):
+        product = self.product(stock=3)
+        variation = Variation.objects.create(reference=product, color='red', title='Red', capacity='64gb', price=120,
+                                             image_url='https://example.com/v.png', stock=0)
+
+        rows = self.check({'items': [
+            {'product_id': product.id, 'quantity': 2},
+            {'product_id': product.id, 'quantity': 1},
+            {'product_id': product.id, 'variation_id': variation.id},
+            {'product_id': 10 ** 6},
+        ]}).json()
+        self.assertEqual([row['in_stock'] for row in rows], [True, True, False, False])
+        self.assertFalse(rows[3]['found'])
+
+    def test_malformed_and_oversized_requests_are_refused(self):
+        self.assertEqual(self.check([{'product_id': 1}]).status_code, 400)
+        self.assertEqual(self.check({'items': {'product_id': 1}}).status_code, 400)
+
+        # Too many lines are refused before any of them is validated
+        with mock.patch('products.views.StockLineSerializer') as serializer:
+            response = self.check({'items': [{'product_id': 'x'}] * 201})
+        self.assertEqual(response.status_code, 400)
+        serializer.assert_not_called()
+
+
+class StockReservationStressTests(TransactionTestCase):
+    """Concurrent checkouts of the last units never sell more than the stock."""
+    workers = 8
+
+    def test_concurrent_reservations_never_oversell(self):
+        store = make_store()
+        category = Category.objects.create(title='Phones', imageUrl='https://example.com/phones.png')
+        brand = Brand.objects.create(title='Acme', imageUrl='https://example.com/acme.png')
+        product = make_product(store, category, brand, stock=5)
+
+        barrier = threading.Barrier(self.workers)
+        outcomes = []
+
+        def checkout():
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        reserve([(product.id, None, 2)])
+                        outcomes.append('reserved')
+                    except InsufficientStock:
+                        outcomes.append('refused')
+                    except OperationalError:
+                        # The shared in-memory SQLite test database fails locked writes instead of waiting
+                        time.sleep(0.01)
+                        continue
+                    return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('reserved'), 2)
+        self.assertEqual(outcomes.count('refused'), self.workers - 2)
+        self.assertEqual(Product.objects.get(id=product.id).stock, 1)
+
+
+class CatalogueImportTests(CatalogueTestCase):
+    def product_rows(self, *titles, store=None):
+        # Categories are given by title and brands by id
+        header = 'title,price,description,product_type,color,capacity,image_urls,category,brand,store_ref'
+        lines = [f'{title},199.99,Imported,phone,black,128gb,a.png|b.png,phones,{self.brand.id},{(store or self.store).id}'
+                 for title in titles]
+        return '\n'.join([header, *lines]) + '\n'
+
+    def test_batches_are_created_and_bad_rows_reported(self):
+        rows = self.product_rows('One', 'Two', 'Three') + 'Bad,not a price,x,phone,black,64gb,,phones,Acme,1\n'
+        importer = CatalogueImporter('products', batch_size=2)
+        with CaptureQueriesContext(connection) as queries:
+            report = importer.run(read_rows(StringIO(rows), 'csv'))
+
+        self.assertEqual((report['created'], report['failed']), (3, 1))
+        self.assertEqual(report['errors'][0]['line'], 5)
+        self.assertIn('price', report['errors'][0]['errors'])
+        imported = Product.objects.get(title='Two')
+        self.assertEqual((imported.category_id, imported.image_urls), (self.category.id, ['a.png', 'b.png']))
+        # The lookups are loaded once; each batch of two rows is a single insert
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "products_product"')]
+        self.assertEqual(len(inserts), 2)
+
+    def test_variations_need_a_product_of_the_allowed_stores(self):
+        product = self.product()
+        other = make_product(make_store(title='Other'), self.category, self.brand)
+        rows = [{'title': 'Red', 'color': 'red', 'capacity': '64gb', 'price': '120', 'image_url': 'https://x.io/r.png',
+                 'reference': reference} for reference in (product.id, other.id)]
+        stream = StringIO(''.join(json.dumps(row) + '\n' for row in rows) + 'not json\n')
+
+        report = CatalogueImporter('variations', store_ids=[self.store.id]).run(read_rows(stream, 'jsonl'))
+        self.assertEqual((report['created'], report['failed']), (1, 2))
+        self.assertEqual(report['errors'][0]['errors'], {'reference': ['Product not found']})
+        self.assertEqual(product.variations.count(), 1)
+
+    def test_upload_is_limited_to_the_sellers_stores(self):
+        token = Token.objects.create(user=self.store.owner)
+        other = make_store(title='Other', owner=User.objects.create_user('other', password='secret'))
+        theirs = self.product_rows('Theirs', store=other).split('\n', 1)[1]
+        upload = SimpleUploadedFile('products.csv', (self.product_rows('Mine') + theirs).encode())
+
+        report = self.client.post('/api/products/import', {'file': upload},
+                                  HTTP_AUTHORIZATION=f'Token {token.key}').json()
+        self.assertEqual((report['created'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0]['errors'], {'store_ref': ['Store reference does not exist']})
+
+
+class ProductFacetTests(CatalogueTestCase):
+    def facets(self, **params):
+        response = self.client.get('/api/products/search/facets', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_exclude_their_own_filter(self):
+        self.product(color='Black, Red', capacity='64gb,128gb', price=Decimal('150'))
+        self.product(color='red', capacity='256gb', price=Decimal('900'))
+        self.product(color='Blue', capacity='64gb', price=Decimal('120'), condition='new')
+
+        facets = self.facets(color=' RED ')
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['color'], [{'value': 'red', 'count': 2}, {'value': 'black', 'count': 1},
+                                           {'value': 'blue', 'count': 1}])
+        self.assertEqual(facets['capacity'], [{'value': '128gb', 'count': 1}, {'value': '256gb', 'count': 1},
+                                              {'value': '64gb', 'count': 1}])
+        self.assertEqual(sum(bucket['count'] for bucket in facets['price_histogram']), 2)
+
+    def test_facet_values_follow_product_changes(self):
+        product = self.product(color='black')
+        product.color = 'Green, black'
+        product.save()
+        rows = self.client.get('/api/products/search', {'color': 'green'}).json()
+        self.assertEqual([row['id'] for row in rows], [product.id])
+
+        # Saves that leave the lists alone don't touch the facet rows
+        product.title = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            Product.objects.only('id', 'title').get(id=product.id).save(update_fields=['title'])
+            product.save()
+        self.assertFalse([query for query in queries if 'productfacetvalue' in query['sql']])
+
+        product.delete()
+        self.assertEqual(self.facets()['color'], [])
+
+    def test_title_counts_every_match(self):
+        for index in range(12):
+            self.product(title=f'Galaxy {index}', color='black' if index % 2 else 'white')
+        self.product(title='Pixel')
+
+        with mock.patch.object(BaseSearchBackend, 'max_results', 5):
+            facets = self.facets(title='galax')
+        self.assertEqual(facets['total'], 12)
+        self.assertEqual(facets['color'], [{'value': 'black', 'count': 6}, {'value': 'white', 'count': 6}])
+
+    def test_non_finite_prices_are_ignored(self):
+        self.product()
+        for value in ('nan', 'inf', '-Infinity', 'sNaN'):
+            self.assertEqual(self.facets(min_price=value, max_price=value)['total'], 1)
+
+
+class SeedScaleTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_scale', products=60, stores=3, categories=4, brands=5, stdout=StringIO(), **options)
+
+    def test_dataset_is_complete_and_consistent(self):
+        self.seed()
+
+        self.assertEqual(Product.objects.count(), 60)
+        self.assertEqual(Store.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertTrue(OrderItem.objects.exists() and Rating.objects.exists())
+        self.assertEqual(StoreOrder.objects.filter(order_items__isnull=True).count(), 0)
+
+        # The derived data is rebuilt afterwards, so the aggregates and indexes agree with the rows
+        product = Product.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(product.rating_count, Rating.objects.filter(product_reference=product).count())
+        self.assertEqual(StoreDailySales.objects.aggregate(total=Sum('delivered_orders'))['total'],
+                         StoreOrder.objects.filter(order_status='delivered').count())
+        color = split_tokens(product.color)[0]
+        self.assertIn(product.id, Product.objects.filter(token_filter('color', color)).values_list('id', flat=True))
+
+    def test_same_seed_gives_the_same_dataset(self):
+        def products():
+            return list(Product.objects.order_by('id').values_list('title', 'price', 'color', 'capacity'))
+
+        self.seed(seed=7)
+        first = products()
+        Product.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(products(), first)
+
+
+class QueryBudgetTests(TestCase):
+    """Every route of the endpoint benchmark stays within its query budget on a cold cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', products=40, stores=2, categories=3, brands=3, stdout=StringIO())
+
+    def test_every_route_is_within_budget(self):
+        from products.management.commands.bench_endpoints import (EXPECTED_STATUSES, Command, Fixtures, QueryCounter,
+                                                                    QUERY_BUDGETS, URL_MODULES, scenarios)
+
+        cases = scenarios(Fixtures())
+        self.assertEqual(Command.route_keys() - {key for key, *_ in cases}, set())
+
+        for key, method, path, kwargs, writes in cases:
+            with self.subTest(key):
+                call = Command.request_factory(self.client, method, URL_MODULES[key.split(':')[0]] + path, kwargs,
+                                               writes)
+                Command.clear_caches()
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    response = call()
+                # The budget is for the success path, not an error response
+                self.assertEqual(response.status_code, EXPECTED_STATUSES.get(key, 200), response.content[:200])
+                self.assertLessEqual(queries.count, QUERY_BUDGETS[key])
@@ -1,88 +1,186 @@
+import io
 import random
 
 import django_filters
-from django.db.models import Count
+from django.db.models import Case, Count, IntegerField, Max, When
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, status
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from core.async_db import aprefetch, gather_queries, run_query
+from core.async_views import AsyncAPIView
+from core.cache import cache_response
+from core.compiled import CompiledListMixin
+from core.conditional import conditional_response
+from core.db_router import ReplicaReadMixin
+from core.pagination import KeysetPagination
 from stores.models import Store
+from products.cache import (catalogue_cache, HOME_CATEGORIES, CATEGORIES, BRANDS, DISCOUNTS, CATEGORY_PRODUCTS,
+                            BRAND_PRODUCTS, FACETS, SINGLE_PRODUCT_TIMEOUT, requested_product_id,
+                            single_product_dependencies, single_product_key, single_product_namespace)
+from products.facets import facet_counts, facets_cache_key, normalise_filters, token_filter
+from products.importer import CatalogueImporter, detect_format, read_rows
 from products.models import Category, Brand, Product
-from .serializers import AddProductSerializer, ProductSerializer, CategorySerializer, BrandSerializer, VariationSerializer, AccessorySerializer, ProductListSerializer
+from products.sampling import product_sampler
+from products.search import get_search_backend
+from products.similarity import similar_products_index
+from products.stock import check_availability
+from .serializers import AddProductSerializer, ProductSerializer, CategorySerializer, BrandSerializer, VariationSerializer, AccessorySerializer, ProductListSerializer, StockLineSerializer
 
 
-class HomeCategoryList(generics.ListAPIView):
+def category_list_state(request):
+    return Category.objects.exclude(title="More").aggregate(last_modified=Max('updated_at'), total=Count('id'))
+
+
+def brand_list_state(request):
+    return Brand.objects.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+
+
+def single_product_state(request):
+    # Let the view answer requests for missing or invalid products
+    product_id = requested_product_id(request)
+    if product_id is None:
+        return None
+    row = Product.objects.filter(id=product_id).values('updated_at', 'store_ref__updated_at').first()
+    if row is None:
+        return None
+    return {'last_modified': max(row['updated_at'], row['store_ref__updated_at'])}
+
+
+class HomeCategoryList(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = CategorySerializer
 
+    @cache_response(catalogue_cache, HOME_CATEGORIES, timeout=60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get all categories except the "More..." category and annotate with a random value
         queryset = Category.objects.exclude(title="More").annotate(random_order=Count('id'))
 
-        # Shuffle the queryset
-        queryset = list(queryset)
-        random.shuffle(queryset)
-
         # Fetch the "More..." category
         more_category = Category.objects.filter(title="More").first()
 
+        return self.arrange(list(queryset), more_category)
+
+    @staticmethod
+    def arrange(categories, more_category):
+        # Shuffle the categories
+        random.shuffle(categories)
+
         # Ensure "More..." is the fifth category if it exists
         if more_category:
-            queryset = queryset[:4] + [more_category] + queryset[4:]
+            categories = categories[:4] + [more_category] + categories[4:]
 
         # Return the first 5 categories (with "More..." in the fifth position)
-        return queryset[:5]
+        return categories[:5]
+
 
+class AsyncHomeCategoryList(AsyncAPIView, HomeCategoryList):
+    @cache_response(catalogue_cache, HOME_CATEGORIES, timeout=60)
+    async def get(self, request, *args, **kwargs):
+        # The categories and the "More..." category don't depend on each other, so fetch them together
+        categories, more_category = await gather_queries(
+            lambda: list(Category.objects.exclude(title="More").annotate(random_order=Count('id'))),
+            lambda: Category.objects.filter(title="More").first(),
+        )
+        serializer = self.get_serializer(self.arrange(categories, more_category), many=True)
+        return Response(serializer.data)
 
-class CategoryList(generics.ListAPIView):
+
+class CategoryList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = CategorySerializer
 
     # Exclude categories where title is "More"
     queryset = Category.objects.exclude(title="More")
 
+    @conditional_response(category_list_state)
+    @cache_response(catalogue_cache, CATEGORIES, timeout=60 * 60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
-class BrandList(generics.ListAPIView):
+class BrandList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = BrandSerializer
 
     queryset = Brand.objects.all()
 
+    @conditional_response(brand_list_state)
+    @cache_response(catalogue_cache, BRANDS, timeout=60 * 60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
-class ProductList(generics.ListAPIView):
+class ProductList(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
+    sample_size = 20
 
     def get_queryset(self):
-        # Get only available products and annotate with a random value
-        queryset = Product.objects.filter(is_available=True).annotate(random_order=Count('id'))
+        # Draw random product IDs from the in-memory pool instead of loading the whole table
+        product_ids = product_sampler.sample(self.sample_size)
 
-        # Shuffle the queryset
-        queryset = list(queryset)
-        random.shuffle(queryset)
+        # Fetch only the sampled rows and keep them in the sampled order
+        products = Product.objects.in_bulk(product_ids)
+        return [products[product_id] for product_id in product_ids if product_id in products]
 
-        # Return the first 20 products
-        return queryset[:20]
 
+class AsyncProductList(AsyncAPIView, ProductList):
+    async def get(self, request, *args, **kwargs):
+        # The sampler reloads its pool from the database when it goes stale
+        product_ids = await run_query(lambda: product_sampler.sample(self.sample_size))
 
-class ProductPagination(PageNumberPagination):
+        products = await run_query(lambda: Product.objects.in_bulk(product_ids))
+        products = [products[product_id] for product_id in product_ids if product_id in products]
+        return Response(self.get_serializer(products, many=True).data)
+
+
+class ProductPagination(KeysetPagination):
     page_size = 10  # Number of items per page
-    page_size_query_param = 'page_size'
-    max_page_size = 100  # Optional, if you want to limit the maximum page size
+    ordering = ('id',)
+
+
+class ProductSearchPagination(ProductPagination):
+    # Search results were never paginated, so only page them for clients sending a cursor
+    legacy_page_numbers = False
+
+    def get_ordering(self, request, queryset, view):
+        # Page text searches by relevance unless the client asked for an explicit ordering.
+        # A blank title is dropped by the filter set, so only a ranked queryset can be ordered by rank.
+        if 'search_rank' in queryset.query.annotations and 'ordering' not in request.query_params:
+            return ('search_rank', 'id')
 
+        # Prices tie, so the id finishes the key: the cursor then seeks on (price, id) instead of an offset
+        ordering = super().get_ordering(request, queryset, view)
+        if not {'id', 'pk'} & {order.lstrip('-') for order in ordering}:
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
 
-class DiscountedProductList(generics.ListAPIView):
+
+class DiscountedProductList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     pagination_class = ProductPagination
 
+    @cache_response(catalogue_cache, DISCOUNTS, timeout=5 * 60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get products where discount is greater than 0
         queryset = Product.objects.filter(discount__gt=0)
         return queryset
 
 
-class CategoryProductList(generics.ListAPIView):
+class CategoryProductList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     pagination_class = ProductPagination
 
+    @cache_response(catalogue_cache, CATEGORY_PRODUCTS, timeout=5 * 60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get the category_id from query params
         category_id = self.request.query_params.get('category_id')
@@ -96,10 +194,14 @@ class CategoryProductList(generics.ListAPIView):
         return queryset
 
 
-class BrandProductList(generics.ListAPIView):
+class BrandProductList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     pagination_class = ProductPagination
 
+    @cache_response(catalogue_cache, BRAND_PRODUCTS, timeout=5 * 60)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get the category_id from query params
         brand_id = self.request.query_params.get('brand_id')
@@ -113,26 +215,27 @@ class BrandProductList(generics.ListAPIView):
         return queryset
 
 
-class FilterSimilarProducts(generics.ListAPIView):
+class FilterSimilarProducts(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     pagination_class = None  # Disable pagination if you don't need it here
+    similar_limit = 6
 
     def get_queryset(self):
         # Get the category from query parameters
         category_id = self.request.query_params.get('category', None)
         product_id = self.request.query_params.get('product_id', None)
 
-        if category_id:
-            # Filter products by the given category ID and exclude the current product
-            queryset = Product.objects.filter(category_id=category_id)
-
-            if product_id:
-                queryset = queryset.exclude(id=product_id)
+        try:
+            category_id = int(category_id) if category_id else None
+            product_id = int(product_id) if product_id else None
+        except ValueError:
+            return Product.objects.none()
 
-            # Shuffle the queryset and limit to 6 items
-            queryset_list = list(queryset)
-            random.shuffle(queryset_list)
-            return queryset_list[:6]
+        if category_id:
+            # Look up the ranked neighbours from the similarity index and fetch only those rows
+            similar_ids = similar_products_index.neighbours(category_id, product_id, self.similar_limit)
+            products = Product.objects.in_bulk(similar_ids)
+            return [products[similar_id] for similar_id in similar_ids if similar_id in products]
 
         # Return an empty queryset if no category is provided
         return Product.objects.none()
@@ -143,20 +246,49 @@ class ProductFilter(django_filters.FilterSet):
     max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     category = django_filters.NumberFilter(field_name='category', lookup_expr='exact')
     brand = django_filters.NumberFilter(field_name='brand', lookup_expr='exact')
-    title = django_filters.CharFilter(field_name='title', lookup_expr='icontains')  # Case-insensitive partial match
+    condition = django_filters.CharFilter(field_name='condition', lookup_expr='iexact')
+    color = django_filters.CharFilter(method='filter_token')  # One entry of the comma separated list
+    capacity = django_filters.CharFilter(method='filter_token')
+    title = django_filters.CharFilter(method='filter_title')  # Ranked full-text match
 
     class Meta:
         model = Product
-        fields = ['min_price', 'max_price', 'category', 'brand', 'title']
+        fields = ['min_price', 'max_price', 'category', 'brand', 'condition', 'color', 'capacity', 'title']
+
+    def filter_token(self, queryset, name, value):
+        return queryset.filter(token_filter(name, value))
 
+    def filter_title(self, queryset, name, value):
+        # Run the search with the other filters applied inside the index query
+        backend = get_search_backend()
+        product_ids = backend.search(value, self.data)
 
-class ProductSearchView(generics.ListAPIView):
+        # The index returns at most max_results matches; the view reports the cap in its response headers
+        self.request.search_limit = backend.max_results
+        self.request.search_truncated = len(product_ids) >= backend.max_results
+
+        # Keep the relevance order so the view can sort by it
+        rank = Case(*[When(id=product_id, then=position) for position, product_id in enumerate(product_ids)],
+                    output_field=IntegerField())
+        return queryset.filter(id__in=product_ids).annotate(search_rank=rank)
+
+
+class ProductSearchView(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductListSerializer
+    pagination_class = ProductSearchPagination
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = ProductFilter
     ordering = ['-price']  # Default ordering, can be adjusted
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        # Text searches are ordered by relevance unless the client asked for an explicit ordering
+        if 'search_rank' in queryset.query.annotations and 'ordering' not in self.request.query_params:
+            queryset = queryset.order_by('search_rank')
+        return queryset
+
     def get(self, request, *args, **kwargs):
         min_price = request.query_params.get('min_price', None)
         max_price = request.query_params.get('max_price', None)
@@ -174,21 +306,120 @@ class ProductSearchView(generics.ListAPIView):
             except ValueError:
                 return Response({"message": "Invalid price values provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        return super().get(request, *args, **kwargs)
+        response = super().get(request, *args, **kwargs)
+
+        # Text searches only cover the best max_results matches of the index, so tell clients when they hit the cap
+        if getattr(request, 'search_limit', None) is not None:
+            response['X-Search-Limit'] = str(request.search_limit)
+            response['X-Search-Truncated'] = 'true' if request.search_truncated else 'false'
+        return response
+
+
+class ProductFacets(ReplicaReadMixin, APIView):
+    def get(self, request):
+        # Equivalent filter sets share one cache entry whatever the parameter order or casing
+        filters = normalise_filters(request.query_params)
+        key = facets_cache_key(filters)
+
+        data = catalogue_cache.get(FACETS, key)
+        if data is None:
+            data = facet_counts(filters)
+            catalogue_cache.set(FACETS, key, data, timeout=5 * 60)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class GetProductById(APIView):
+    @conditional_response(single_product_state)
+    @cache_response(catalogue_cache, lambda request: single_product_namespace(requested_product_id(request)),
+                    timeout=SINGLE_PRODUCT_TIMEOUT, depends_on=single_product_dependencies)
     def get(self, request):
-        product_id = request.query_params.get('product_id', None)
+        product_id = requested_product_id(request)
+        if product_id is None:
+            return Response({"message": "Product id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        # Screens that only need a card ask for a few fields, and the query shrinks with them
+        fieldset = ProductSerializer.fieldset_from_request(request)
         try:
-            product = Product.objects.get(id=product_id)
+            product = ProductSerializer.setup_eager_loading(Product.objects.all(), fieldset).get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = ProductSerializer(product)
+        serializer = ProductSerializer(product, fieldset=fieldset)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class AsyncGetProductById(AsyncAPIView, GetProductById):
+    @conditional_response(single_product_state)
+    @cache_response(catalogue_cache, lambda request: single_product_namespace(requested_product_id(request)),
+                    timeout=SINGLE_PRODUCT_TIMEOUT, depends_on=single_product_dependencies)
+    async def get(self, request):
+        product_id = requested_product_id(request)
+        if product_id is None:
+            return Response({"message": "Product id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        fieldset = ProductSerializer.fieldset_from_request(request)
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.all(), fieldset).prefetch_related(None)
+        try:
+            product = await run_query(lambda: queryset.get(id=product_id))
+        except Product.DoesNotExist:
+            return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Accessories and variations are independent, so both queries run at the same time
+        await aprefetch([product], *ProductSerializer.prefetch_lookups(fieldset))
+
+        serializer = ProductSerializer(product, fieldset=fieldset)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class GetProductsByIds(APIView):
+    """Many products in one request, for the cart, wishlist and order-again screens."""
+    max_ids = 100
+
+    def get(self, request):
+        ids = request.query_params.get('ids', '')
+        try:
+            # Keep the requested order, without duplicates
+            product_ids = list(dict.fromkeys(int(product_id) for product_id in ids.split(',') if product_id.strip()))
+        except ValueError:
+            return Response({"message": "Invalid product ids"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not product_ids:
+            return Response({"message": "Product ids are required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(product_ids) > self.max_ids:
+            return Response({"message": f"At most {self.max_ids} products can be requested at once"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fieldset = ProductSerializer.fieldset_from_request(request)
+        if fieldset is None:
+            products = self.get_cached_products(product_ids)
+        else:
+            # Sparse payloads are cheap to build from the narrowed query, so they aren't cached
+            products = self.load_products(product_ids, fieldset)
+
+        # Unknown products are left out
+        return Response([products[product_id] for product_id in product_ids if product_id in products])
+
+    @staticmethod
+    def load_products(product_ids, fieldset=None):
+        # One query for the products and their stores and one per prefetched relation, whatever the number of IDs
+        products = ProductSerializer.setup_eager_loading(Product.objects.all(), fieldset).in_bulk(product_ids)
+        return dict(zip(products, ProductSerializer(list(products.values()), many=True, fieldset=fieldset).data))
+
+    def get_cached_products(self, product_ids):
+        # The entries are the ones GetProductById caches, so either endpoint warms the other
+        keys = {product_id: (single_product_namespace(product_id), single_product_key(product_id))
+                for product_id in product_ids}
+        cached = catalogue_cache.get_many(keys.values())
+        products = {product_id: cached[key] for product_id, key in keys.items() if key in cached}
+
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            loaded = self.load_products(missing)
+            if loaded:
+                catalogue_cache.set_many({keys[product_id]: data for product_id, data in loaded.items()},
+                                         SINGLE_PRODUCT_TIMEOUT, depends_on=single_product_dependencies)
+            products.update(loaded)
+        return products
+
+
 class AddVariationToProduct(APIView):
     def post(self, request):
         # Get product ID from the query parameters
@@ -250,11 +481,50 @@ class AddProduct(APIView):
         # Deserialize and validate the product data
         product_serializer = ProductSerializer(data=product_data)
         if product_serializer.is_valid():
-            product = product_serializer.save()  # Save the product instance
+            # store_ref is read-only on the serializer, so the store is passed to save()
+            product = product_serializer.save(store_ref=store)
             return Response({"id": product.id}, status=status.HTTP_201_CREATED)  # Return only the product id
         else:
             return Response(product_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ImportCatalogue(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"message": "A CSV or JSONL file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        kind = request.data.get('kind', 'products')
+        if kind not in CatalogueImporter.serializers:
+            return Response({"message": f"Unknown import kind '{kind}'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Sellers can only import into their own stores
+        store_ids = None
+        if not request.user.is_staff:
+            store_ids = list(Store.objects.filter(owner=request.user).values_list('id', flat=True))
+
+        # Large uploads are spooled to disk by Django and read back line by line
+        file_format = request.data.get('format') or detect_format(upload.name)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        importer = CatalogueImporter(kind, store_ids=store_ids)
+        try:
+            report = importer.run(read_rows(stream, file_format))
+        except UnicodeDecodeError:
+            return Response({"message": "The file must be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class CatalogueCacheStats(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # Hit and miss counters of this worker's catalogue cache, used to size it
+        return Response(catalogue_cache.stats(), status=status.HTTP_200_OK)
+
+
 class CheckProductAvailability(APIView):
     def get(self, request):
         # Extract the product_id from query parameters
@@ -279,4 +549,23 @@ class CheckProductAvailability(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
+class CheckProductsAvailability(APIView):
+    max_items = 200
 
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return Response({"message": "Expected an object with a list of items"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Refuse oversized carts before validating any of their lines
+        items = request.data.get('items', [])
+        if isinstance(items, list) and len(items) > self.max_items:
+            return Response({"message": f"At most {self.max_items} items can be checked at once"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Validate every cart line at once
+        serializer = StockLineSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = [(item['product_id'], item.get('variation_id'), item['quantity']) for item in serializer.validated_data]
+        return Response(check_availability(lines), status=status.HTTP_200_OK)
@@ -0,0 +1,51 @@
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, \
+    Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from products.models import Product
+from stores.models import Store
+from .models import Rating
+
+# Number of latest reviews kept on Product.reviews
+LATEST_REVIEWS_SIZE = 3
+
+
+def running_average(value):
+    # New average computed from the stored sum and count in the same UPDATE that increments them
+    return ExpressionWrapper(
+        (F('rating_total') + value) / (F('rating_count') + 1),
+        output_field=DecimalField(max_digits=4, decimal_places=2),
+    )
+
+
+def add_to_ring(reviews, review, size=LATEST_REVIEWS_SIZE):
+    # Newest review first, dropping the oldest once the ring is full
+    return [review, *(reviews if isinstance(reviews, list) else [])][:size]
+
+
+def recount(model, reference, rating_field, average_field):
+    """Recompute the stored sum, count and average of every row that drifted from the ratings table."""
+    ratings = Rating.objects.filter(**{reference: OuterRef('pk')}).order_by().values(reference)
+    total = Coalesce(Subquery(ratings.annotate(total=Sum(rating_field)).values('total')),
+                     Value(0.0), output_field=FloatField())
+    count = Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')),
+                     Value(0), output_field=IntegerField())
+
+    drifted = model.objects.annotate(actual_total=total, actual_count=count).exclude(
+        rating_total=F('actual_total'), rating_count=F('actual_count')
+    )
+    fixed = 0
+    for row in drifted.values('pk', 'actual_total', 'actual_count').iterator():
+        updates = {'rating_total': row['actual_total'], 'rating_count': row['actual_count']}
+        if row['actual_count']:
+            updates[average_field] = round(row['actual_total'] / row['actual_count'], 2)
+        fixed += model.objects.filter(pk=row['pk']).update(**updates)
+    return fixed
+
+
+def reconcile_products():
+    return recount(Product, 'product_reference', 'product_rating', 'ratings')
+
+
+def reconcile_stores():
+    return recount(Store, 'store_reference', 'store_rating', 'store_rating')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product
+from ratings.aggregates import LATEST_REVIEWS_SIZE, reconcile_products, reconcile_stores
+from ratings.models import Rating
+from ratings.serializers import RatingSerializer
+
+
+class Command(BaseCommand):
+    help = "Fix drift between the running rating aggregates and the ratings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', action='store_true',
+                            help="Also rebuild the latest reviews stored on every rated product")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            products_fixed = reconcile_products()
+            stores_fixed = reconcile_stores()
+        self.stdout.write(f"Reconciled {products_fixed} products and {stores_fixed} stores")
+
+        if options['reviews']:
+            rated_products = Rating.objects.values_list('product_reference', flat=True).distinct()
+            for product_id in rated_products.iterator():
+                latest = Rating.objects.filter(product_reference=product_id).order_by('-id')
+                reviews = RatingSerializer(latest[:LATEST_REVIEWS_SIZE], many=True).data
+                Product.objects.filter(id=product_id).update(reviews=list(reviews))
+            self.stdout.write("Rebuilt latest reviews")
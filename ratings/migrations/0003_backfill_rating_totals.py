@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 15:39
+
+from django.db import migrations
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Rating = apps.get_model('ratings', 'Rating')
+    Product = apps.get_model('products', 'Product')
+    Store = apps.get_model('stores', 'Store')
+
+    for model, reference, rating_field in (
+        (Product, 'product_reference', 'product_rating'),
+        (Store, 'store_reference', 'store_rating'),
+    ):
+        ratings = Rating.objects.filter(**{reference: OuterRef('pk')}).order_by().values(reference)
+        model.objects.update(
+            rating_total=Coalesce(Subquery(ratings.annotate(total=Sum(rating_field)).values('total')),
+                                  Value(0.0), output_field=FloatField()),
+            rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')),
+                                  Value(0), output_field=IntegerField()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ratings', '0002_remove_rating_userid_rating_profile_image_and_more'),
+        ('products', '0007_product_rating_total'),
+        ('stores', '0010_store_rating_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
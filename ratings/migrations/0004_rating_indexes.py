@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_history_index'),
+        ('products', '0010_product_indexes'),
+        ('ratings', '0003_backfill_rating_totals'),
+        ('stores', '0011_storeorder_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['product_reference', '-created_at'], name='rating_product_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['user_id'], name='rating_user_idx'),
+        ),
+    ]
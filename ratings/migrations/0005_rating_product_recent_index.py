@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ratings', '0004_rating_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='rating',
+            name='rating_product_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['product_reference', '-id'], name='rating_product_recent_idx'),
+        ),
+    ]
@@ -20,5 +20,12 @@ class Rating(models.Model):
     created_at = models.DateTimeField(auto_now=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Reviews of a product, newest first; created_at moves when a rating is edited, so they page on id
+            models.Index(fields=['product_reference', '-id'], name='rating_product_recent_idx'),
+            models.Index(fields=['user_id'], name='rating_user_idx'),  # Reviews of a user
+        ]
+
     def __str__(self):
         return f"Rating for {self.product_reference.title} by {self.user_id} at {self.store_reference.title}"
@@ -1,3 +1,83 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from orders.models import Order
+from products.cache import catalogue_cache
+from products.models import Brand, Category, Product
+from products.tests import make_product, make_store
+from stores.models import Store
+
+
+class RatingTestCase(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title='Phones', imageUrl='https://example.com/phones.png')
+        brand = Brand.objects.create(title='Acme', imageUrl='https://example.com/acme.png')
+        self.store = make_store()
+        self.product = make_product(self.store, category, brand)
+        self.order = Order.objects.create(user='7', total_price=100, delivery_price=10)
+
+    def rate(self, product_rating, store_rating, review='Fine'):
+        return self.client.post('/api/ratings/ratings/', {
+            'userId': '7', 'user_id': '7', 'order_reference': self.order.id, 'review': review,
+            'product_reference': self.product.id, 'store_reference': self.store.id,
+            'product_rating': product_rating, 'store_rating': store_rating,
+        }, content_type='application/json')
+
+
+class AddRatingTests(RatingTestCase):
+    def test_running_aggregates_and_latest_reviews(self):
+        for index, (product_rating, store_rating) in enumerate([(5, 4), (4, 4), (3, 1), (1, 2)]):
+            self.assertEqual(self.rate(product_rating, store_rating, review=f'Review {index}').status_code, 201)
+
+        product = Product.objects.get(id=self.product.id)
+        self.assertEqual((product.rating_total, product.rating_count), (13, 4))
+        self.assertEqual(product.ratings, Decimal('3.25'))
+        self.assertEqual([review['review'] for review in product.reviews], ['Review 3', 'Review 2', 'Review 1'])
+
+        store = Store.objects.get(id=self.store.id)
+        self.assertEqual((store.rating_total, store.rating_count), (11, 4))
+        self.assertEqual(store.store_rating, Decimal('2.75'))
+        self.assertEqual(Order.objects.get(id=self.order.id).rated_products, [self.product.id])
+
+    def test_cached_products_of_the_store_show_its_new_rating(self):
+        for backend in caches.all():
+            backend.clear()
+        catalogue_cache.local.clear()
+        sibling = make_product(self.store, self.product.category, self.product.brand, title='Sibling')
+        self.client.get('/api/products/singles', {'product_id': sibling.id})
+        self.client.get('/api/products/batch', {'ids': sibling.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.rate(5, 1).status_code, 201)
+
+        single = self.client.get('/api/products/singles', {'product_id': sibling.id}).json()
+        self.assertEqual(single['store_ref']['store_rating'], '1.00')
+        batch = self.client.get('/api/products/batch', {'ids': sibling.id}).json()
+        self.assertEqual(batch[0]['store_ref']['store_rating'], '1.00')
+
+    def test_unknown_orders_are_not_rated(self):
+        self.order.user = '8'
+        self.order.save()
+        self.assertEqual(self.rate(5, 5).status_code, 404)
+        self.assertEqual(Product.objects.get(id=self.product.id).rating_count, 0)
+
+
+class ReconcileRatingsTests(RatingTestCase):
+    def test_drift_is_fixed(self):
+        self.rate(5, 4)
+        self.rate(2, 2, review='Latest')
+        Product.objects.filter(id=self.product.id).update(rating_total=0, rating_count=9, reviews=[])
+        Store.objects.filter(id=self.store.id).update(rating_count=1)
+
+        output = StringIO()
+        call_command('reconcile_ratings', '--reviews', stdout=output)
+        self.assertIn('Reconciled 1 products and 1 stores', output.getvalue())
+
+        product = Product.objects.get(id=self.product.id)
+        self.assertEqual((product.rating_total, product.rating_count, product.ratings), (7, 2, Decimal('3.50')))
+        self.assertEqual(product.reviews[0]['review'], 'Latest')
+        self.assertEqual(Store.objects.get(id=self.store.id).rating_count, 2)
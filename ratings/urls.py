@@ -1,9 +1,10 @@
 from django.urls import path
+from core.async_views import read_view
 from . import views
 
 urlpatterns = [
-    path('reviews/user/', views.UserReviewsList.as_view(), name='get-user-reviews'),
-    path('reviews/store/', views.StoreReviewsList.as_view(), name='get-store-reviews'),
-    path('reviews/product/', views.ProductReviewsList.as_view(), name='get-product-reviews'),
+    path('reviews/user/', read_view(views.UserReviewsList, views.AsyncUserReviewsList), name='get-user-reviews'),
+    path('reviews/store/', read_view(views.StoreReviewsList, views.AsyncStoreReviewsList), name='get-store-reviews'),
+    path('reviews/product/', read_view(views.ProductReviewsList, views.AsyncProductReviewsList), name='get-product-reviews'),
     path('ratings/', views.AddRatingView.as_view(), name='add-rating'),
 ]
\ No newline at end of file
@@ -1,15 +1,40 @@
-from django.db.models import Avg
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 
+from core.async_views import AsyncAPIView
+from core.compiled import CompiledListMixin
+from core.conditional import conditional_response
+from core.db_router import ReplicaReadMixin
+from core.pagination import KeysetPagination
 from orders.models import Order
+from products.cache import catalogue_cache, single_product_namespace, store_namespace
+from .aggregates import add_to_ring, running_average
 from .models import Rating, Product, Store
 from .serializers import RatingSerializer
 
 
+def reviews_state(field_name, param):
+    # Validator for a reviews list filtered by one query parameter
+    def state(request):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            return Rating.objects.filter(**{field_name: value}).aggregate(
+                last_modified=Max('updated_at'), total=Count('id')
+            )
+        except (ValueError, TypeError):
+            return None
+
+    return state
+
+
 class AddRatingView(APIView):
+    @transaction.atomic
     def post(self, request):
         # Extract data from request
         user_id = request.data.get('userId')
@@ -24,14 +49,12 @@ class AddRatingView(APIView):
             return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Ensure the store exists
-        try:
-            store = Store.objects.get(id=store_id)
-        except Store.DoesNotExist:
+        if not Store.objects.filter(id=store_id).exists():
             return Response({"message": "Store not found or is closed"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Ensure the product exists
+        # Ensure the product exists, locking it so concurrent ratings update the reviews one at a time
         try:
-            product = Product.objects.get(id=product_id)
+            product = Product.objects.select_for_update().only('id', 'reviews').get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -43,40 +66,49 @@ class AddRatingView(APIView):
             # Update rated_products list in the order
             if product_id not in order.rated_products:
                 order.rated_products.append(product_id)
-                order.save()
-
-            # Update product ratings and rating count
-            product_ratings = Rating.objects.filter(product_reference=product)
-            product.rating_count = product_ratings.count()
-            product.ratings = product_ratings.aggregate(Avg('product_rating'))['product_rating__avg']
+                order.save(update_fields=['rated_products', 'updated_at'])
 
-            # Get the 3 latest reviews for the product
-            latest_reviews = product_ratings.order_by('-created_at')[:3]
-            # Extract review text
-            product.reviews = latest_reviews
-
-            product.save()
+            # Add the rating to the running sums and keep the latest reviews as a bounded ring
+            Product.objects.filter(id=product.id).update(
+                ratings=running_average(rating.product_rating),
+                rating_total=F('rating_total') + rating.product_rating,
+                rating_count=F('rating_count') + 1,
+                reviews=add_to_ring(product.reviews, serializer.data),
+                updated_at=timezone.now(),
+            )
 
             # Update store rating
-            store_ratings = Rating.objects.filter(store_reference=store)
-            store.store_rating = store_ratings.aggregate(Avg('store_rating'))['store_rating__avg']
-            store.save()
+            Store.objects.filter(id=store_id).update(
+                store_rating=running_average(rating.store_rating),
+                rating_total=F('rating_total') + rating.store_rating,
+                rating_count=F('rating_count') + 1,
+                updated_at=timezone.now(),
+            )
+
+            # The queryset updates skip the model signals, so once committed drop the cached product and,
+            # as every product payload nests its store's rating, the cached products of the store
+            transaction.on_commit(lambda: catalogue_cache.invalidate(
+                single_product_namespace(product.id), store_namespace(rating.store_reference_id)
+            ))
 
             return Response({"message": "Rating added successfully"}, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RatingsPagination(PageNumberPagination):
+class RatingsPagination(KeysetPagination):
     page_size = 20  # Number of items per page
-    page_size_query_param = 'page_size'
-    max_page_size = 100  # Optional, if you want to limit the maximum page size
+    ordering = ('-id',)  # Newest first; created_at changes whenever a rating is edited
 
 
-class UserReviewsList(generics.ListAPIView):
+class UserReviewsList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = RatingSerializer
     pagination_class = RatingsPagination
 
+    @conditional_response(reviews_state('user_id', 'user_id'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get the category_id from query params
         user_id = self.request.query_params.get('user_id')
@@ -90,10 +122,20 @@ class UserReviewsList(generics.ListAPIView):
         return queryset
 
 
-class StoreReviewsList(generics.ListAPIView):
+class AsyncUserReviewsList(AsyncAPIView, UserReviewsList):
+    @conditional_response(reviews_state('user_id', 'user_id'))
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+
+class StoreReviewsList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = RatingSerializer
     pagination_class = RatingsPagination
 
+    @conditional_response(reviews_state('store_reference', 'store_id'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # Get the category_id from query params
         store_id = self.request.query_params.get('store_id')
@@ -107,10 +149,20 @@ class StoreReviewsList(generics.ListAPIView):
         return queryset
 
 
-class ProductReviewsList(generics.ListAPIView):
+class AsyncStoreReviewsList(AsyncAPIView, StoreReviewsList):
+    @conditional_response(reviews_state('store_reference', 'store_id'))
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+
+class ProductReviewsList(ReplicaReadMixin, CompiledListMixin, generics.ListAPIView):
     serializer_class = RatingSerializer
     pagination_class = RatingsPagination
 
+    @conditional_response(reviews_state('product_reference', 'product_id'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         product_id = self.request.query_params.get('product_id')
 
@@ -120,3 +172,9 @@ class ProductReviewsList(generics.ListAPIView):
         # Filter products by the given category ID
         queryset = Rating.objects.filter(product_reference=product_id)
         return queryset
+
+
+class AsyncProductReviewsList(AsyncAPIView, ProductReviewsList):
+    @conditional_response(reviews_state('product_reference', 'product_id'))
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
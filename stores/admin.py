@@ -5,3 +5,5 @@ from stores import models
 
 admin.site.register(models.Store)
 admin.site.register(models.StoreOrder)
+admin.site.register(models.StoreDailySales)
+admin.site.register(models.StoreDailyProductSales)
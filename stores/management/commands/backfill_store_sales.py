@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from orders.models import OrderItem
+from stores.models import Store, StoreOrder, StoreDailySales, StoreDailyProductSales
+from stores.rollups import status_field
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily store sales rollups from the existing store orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, help="Only rebuild the rollups of this store")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        store_ids = Store.objects.values('id')
+        if options['store']:
+            store_ids = store_ids.filter(id=options['store'])
+
+        store_orders = StoreOrder.objects.filter(store_reference__in=store_ids).annotate(day=TruncDate('created_at'))
+
+        # Status counts per store and day
+        daily = defaultdict(dict)
+        for row in store_orders.values('store_reference', 'day', 'order_status').annotate(total=Count('id')):
+            daily[(row['store_reference'], row['day'])][status_field(row['order_status'])] = row['total']
+
+        # Delivered revenue and items per store and day
+        delivered = store_orders.filter(order_status='delivered').values('store_reference', 'day').annotate(
+            revenue=Sum('order_items__price'), items=Sum('order_items__quantity')
+        )
+        for row in delivered:
+            daily[(row['store_reference'], row['day'])].update(
+                delivered_revenue=row['revenue'] or 0, delivered_items=row['items'] or 0
+            )
+
+        # Quantities per product, store and day across all statuses
+        product_rows = OrderItem.objects.annotate(
+            rollup_store=F('store_orders__store_reference'), day=TruncDate('store_orders__created_at')
+        ).filter(rollup_store__in=store_ids).values('rollup_store', 'day', 'product').annotate(
+            total_quantity=Sum('quantity')
+        )
+
+        with transaction.atomic():
+            daily_sales = StoreDailySales.objects.all()
+            product_sales = StoreDailyProductSales.objects.all()
+            if options['store']:
+                daily_sales = daily_sales.filter(store_id=options['store'])
+                product_sales = product_sales.filter(store_id=options['store'])
+            daily_sales.delete()
+            product_sales.delete()
+
+            StoreDailySales.objects.bulk_create(
+                [StoreDailySales(store_id=store_id, date=day, **counters) for (store_id, day), counters in daily.items()],
+                batch_size=options['batch_size'],
+            )
+            StoreDailyProductSales.objects.bulk_create(
+                (StoreDailyProductSales(store_id=row['rollup_store'], date=row['day'], product_id=row['product'],
+                                        quantity=row['total_quantity']) for row in product_rows.iterator()),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(daily)} daily store sales rows"))
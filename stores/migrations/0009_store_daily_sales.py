@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+        ('stores', '0008_alter_storeorder_order_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreDailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='stores.store')),
+            ],
+            options={
+                'unique_together': {('store', 'date', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StoreDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('delivered_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('delivered_items', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('confirmed_orders', models.IntegerField(default=0)),
+                ('processing_orders', models.IntegerField(default=0)),
+                ('delivered_orders', models.IntegerField(default=0)),
+                ('refunded_orders', models.IntegerField(default=0)),
+                ('canceled_orders', models.IntegerField(default=0)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='stores.store')),
+            ],
+            options={
+                'unique_together': {('store', 'date')},
+            },
+        ),
+    ]
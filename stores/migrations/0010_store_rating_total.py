@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0009_store_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_total',
+            field=models.FloatField(default=0),
+        ),
+    ]
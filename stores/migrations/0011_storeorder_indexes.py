@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('address', '0003_address_indexes'),
+        ('orders', '0011_order_history_index'),
+        ('stores', '0010_store_rating_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='storeorder',
+            index=models.Index(fields=['store_reference', '-created_at', '-id'], name='storeorder_store_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storeorder',
+            index=models.Index(fields=['store_reference', 'order_status', 'created_at'], name='storeorder_store_status_idx'),
+        ),
+    ]
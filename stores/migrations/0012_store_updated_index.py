@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0011_storeorder_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['updated_at'], name='store_updated_idx'),
+        ),
+    ]
@@ -19,9 +19,17 @@ class Store(models.Model):
     is_featured = models.BooleanField(default=False)
     is_open = models.BooleanField(default=False)
     store_rating = models.DecimalField(decimal_places=2, max_digits=4, null=True, blank=True, default=3)
+    rating_total = models.FloatField(default=0)  # Running sum of store ratings
+    rating_count = models.IntegerField(default=0)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Also touched when one of its products is deleted
+
+    class Meta:
+        indexes = [
+            # The all-stores validator reads the latest modification
+            models.Index(fields=['updated_at'], name='store_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -44,5 +52,46 @@ class StoreOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # store_reference is a plain integer, so nothing indexes it by default
+            models.Index(fields=['store_reference', '-created_at', '-id'], name='storeorder_store_recent_idx'),
+            models.Index(fields=['store_reference', 'order_status', 'created_at'], name='storeorder_store_status_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_reference} for Store {self.store_reference}"
+
+
+class StoreDailySales(models.Model):
+    """Per-store, per-day rollup of StoreOrder activity, keyed by the order's creation day."""
+    store = models.ForeignKey(Store, related_name='daily_sales', on_delete=models.CASCADE)
+    date = models.DateField()
+    delivered_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    delivered_items = models.IntegerField(default=0)
+    pending_orders = models.IntegerField(default=0)
+    confirmed_orders = models.IntegerField(default=0)
+    processing_orders = models.IntegerField(default=0)
+    delivered_orders = models.IntegerField(default=0)
+    refunded_orders = models.IntegerField(default=0)
+    canceled_orders = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('store', 'date')
+
+    def __str__(self):
+        return f"Sales for Store {self.store_id} on {self.date}"
+
+
+class StoreDailyProductSales(models.Model):
+    """Quantity of each product ordered from a store per day, across all order statuses."""
+    store = models.ForeignKey(Store, related_name='daily_product_sales', on_delete=models.CASCADE)
+    date = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('store', 'date', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x Product {self.product_id} for Store {self.store_id} on {self.date}"
@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from stores.models import StoreDailySales, StoreDailyProductSales
+
+
+def status_field(order_status):
+    return f"{order_status}_orders"
+
+
+def order_day(store_order):
+    return timezone.localdate(store_order.created_at)
+
+
+def _apply(daily_deltas, product_deltas):
+    # Make sure every touched row exists, then increment it in place with F() expressions
+    StoreDailySales.objects.bulk_create(
+        [StoreDailySales(store_id=store_id, date=day) for store_id, day in daily_deltas],
+        ignore_conflicts=True,
+    )
+    StoreDailyProductSales.objects.bulk_create(
+        [StoreDailyProductSales(store_id=store_id, date=day, product_id=product_id)
+         for (store_id, day), quantities in product_deltas.items() for product_id in quantities],
+        ignore_conflicts=True,
+    )
+
+    for (store_id, day), deltas in daily_deltas.items():
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if updates:
+            StoreDailySales.objects.filter(store_id=store_id, date=day).update(**updates)
+
+    # One UPDATE per store and day, whatever the number of products
+    for (store_id, day), quantities in product_deltas.items():
+        increments = Case(*[When(product_id=product_id, then=Value(quantity))
+                            for product_id, quantity in quantities.items()], default=Value(0))
+        StoreDailyProductSales.objects.filter(
+            store_id=store_id, date=day, product_id__in=quantities
+        ).update(quantity=F('quantity') + increments)
+
+
+def record_store_orders(entries, sign=1, count_status=True):
+    """
+    Add (or with sign=-1 remove) store orders and their items to the rollups.
+
+    `entries` is a list of (store_order, order_items) pairs. Pass
+    count_status=False when only items were linked to an existing order.
+    """
+    daily_deltas = defaultdict(lambda: defaultdict(int))
+    product_deltas = defaultdict(lambda: defaultdict(int))
+
+    for store_order, items in entries:
+        if store_order.store_reference is None:
+            continue
+        key = (store_order.store_reference, order_day(store_order))
+
+        if count_status:
+            daily_deltas[key][status_field(store_order.order_status)] += sign
+
+        for item in items:
+            product_deltas[key][item.product_id] += sign * item.quantity
+
+        if store_order.order_status == 'delivered' and items:
+            daily_deltas[key]['delivered_revenue'] += sign * sum(item.price for item in items)
+            daily_deltas[key]['delivered_items'] += sign * sum(item.quantity for item in items)
+
+    _apply(daily_deltas, product_deltas)
+
+
+def record_status_change(store_order, old_status):
+    """Move a store order between status counters, adjusting delivered totals when needed."""
+    if store_order.store_reference is None or old_status == store_order.order_status:
+        return
+
+    deltas = {status_field(old_status): -1, status_field(store_order.order_status): 1}
+
+    if 'delivered' in (old_status, store_order.order_status):
+        sign = 1 if store_order.order_status == 'delivered' else -1
+        totals = store_order.order_items.aggregate(revenue=Sum('price'), items=Sum('quantity'))
+        deltas['delivered_revenue'] = sign * (totals['revenue'] or 0)
+        deltas['delivered_items'] = sign * (totals['items'] or 0)
+
+    _apply({(store_order.store_reference, order_day(store_order)): deltas}, {})
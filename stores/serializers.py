@@ -1,8 +1,11 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+
+from core.fieldsets import SparseFieldsMixin
 from stores.models import Store
 
 
-class StoreSerializer(serializers.ModelSerializer):
+class StoreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     store_products = serializers.SerializerMethodField()
 
     class Meta:
@@ -12,11 +15,40 @@ class StoreSerializer(serializers.ModelSerializer):
             'website', 'logo_url', 'opening_hours', 'store_rating', 'store_products',
             'is_featured', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['store_products']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, products_limit=None, fieldset=None):
+        if fieldset is not None:
+            queryset = queryset.only(*cls.only_columns(fieldset))
+            if 'store_products' not in fieldset:
+                return queryset
+
+        # Load products with their store, variations and accessories in one query each
+        products = cls.products_queryset(products_limit).prefetch_related('accessories', 'variations')
+        return queryset.prefetch_related(cls.products_prefetch(products))
+
+    @staticmethod
+    def products_queryset(products_limit=None):
+        # Import Product here to avoid circular import at the top
+        from products.models import Product
+
+        products = Product.objects.select_related('store_ref').order_by('id')
+        if products_limit is not None:
+            products = products[:products_limit]
+        return products
+
+    @staticmethod
+    def products_prefetch(products):
+        return Prefetch('product_set', queryset=products, to_attr='prefetched_products')
 
     def get_store_products(self, obj):
         # Import ProductSerializer here to avoid circular import at the top
         from products.serializers import ProductSerializer
-        products = obj.product_set.all()  # Assuming reverse relationship from Store to Product
+        # Use the products loaded by setup_eager_loading, falling back to the reverse relationship
+        products = getattr(obj, 'prefetched_products', None)
+        if products is None:
+            products = obj.product_set.all()
         return ProductSerializer(products, many=True).data
 
 
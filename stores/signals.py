@@ -0,0 +1,39 @@
+from django.db.models.signals import m2m_changed, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from orders.models import OrderItem
+from stores.models import StoreOrder
+from stores.rollups import record_status_change, record_store_orders
+
+
+@receiver(post_init, sender=StoreOrder)
+def remember_store_order_status(sender, instance, **kwargs):
+    # Keep the loaded status so a later save can tell whether it changed
+    instance._rollup_status = instance.order_status
+
+
+@receiver(post_save, sender=StoreOrder)
+def update_rollups_on_save(sender, instance, created, **kwargs):
+    if created:
+        record_store_orders([(instance, [])])
+    else:
+        record_status_change(instance, instance._rollup_status)
+    instance._rollup_status = instance.order_status
+
+
+@receiver(pre_delete, sender=StoreOrder)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    record_store_orders([(instance, list(instance.order_items.all()))], sign=-1)
+
+
+@receiver(m2m_changed, sender=StoreOrder.order_items.through)
+def update_rollups_on_items_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Items linked from the OrderItem side are rare and not tracked here
+    if reverse:
+        return
+
+    if action in ('post_add', 'post_remove'):
+        items = list(OrderItem.objects.filter(pk__in=pk_set))
+        record_store_orders([(instance, items)], sign=1 if action == 'post_add' else -1, count_status=False)
+    elif action == 'pre_clear':
+        record_store_orders([(instance, list(instance.order_items.all()))], sign=-1, count_status=False)
@@ -1,3 +1,154 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from orders.tests import OrderTestCase
+from products.models import Accessory, Brand, Category, Product, Variation
+from products.tests import make_product, make_store
+from stores.models import StoreDailySales, StoreOrder
+
+
+class StoreCatalogueTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Phones', imageUrl='https://example.com/phones.png')
+        self.brand = Brand.objects.create(title='Acme', imageUrl='https://example.com/acme.png')
+
+    def stocked_store(self, products=2, **fields):
+        store = make_store(**fields)
+        for index in range(products):
+            product = make_product(store, self.category, self.brand, title=f'{store.title} {index}')
+            Variation.objects.create(reference=product, color='red', title='Red', capacity='64gb',
+                                     price=100, image_url='https://example.com/v.png')
+            Accessory.objects.create(reference=product, title='Case', price=10, image_url='https://example.com/a.png')
+        return store
+
+
+class GetStoresTests(StoreCatalogueTestCase):
+    def all_stores(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stores/all-stores', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_stores_and_products(self):
+        self.stocked_store(products=1, title='First')
+        _, few = self.all_stores()
+
+        for index in range(3):
+            self.stocked_store(products=4, title=f'Store {index}')
+        stores, many = self.all_stores()
+
+        self.assertEqual(len(stores), 4)
+        self.assertEqual(many, few)
+        nested = stores[1]['store_products'][0]
+        self.assertEqual(len(nested['variations']), 1)
+        self.assertEqual(len(nested['accessories']), 1)
+
+    def test_products_per_store_caps_the_nested_products(self):
+        self.stocked_store(products=5)
+
+        page, _ = self.all_stores(page=1, products_per_store=2)
+        self.assertEqual(page['count'], 1)
+        self.assertEqual(len(page['results'][0]['store_products']), 2)
+
+    def test_sparse_fieldset_leaves_the_products_out(self):
+        store = self.stocked_store(products=3)
+        _, full = self.all_stores()
+
+        stores, sparse = self.all_stores(fields='title,id')
+        self.assertEqual(stores, [{'id': store.id, 'title': store.title}])
+        # The validator's two aggregates and the stores, without the product prefetches
+        self.assertEqual(sparse, 3)
+        self.assertLess(sparse, full)
+
+        stores, _ = self.all_stores(fields='id', expand='store_products')
+        self.assertEqual(list(stores[0]), ['id', 'store_products'])
+        self.assertEqual(len(stores[0]['store_products']), 3)
+
+        response = self.client.get('/api/stores/all-stores', {'expand': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StoreOrdersListTests(OrderTestCase):
+    def test_sparse_fieldset(self):
+        self.add_order(self.products[:2])
+        params = {'store_id': self.stores[0].id, 'cursor': '', 'fields': 'id,order_reference'}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stores/store-orders', params)
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'order_reference'])
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('"stores_storeorder"', sql)
+        self.assertNotIn('JOIN', sql)
+
+        response = self.client.get('/api/stores/store-orders', {**params, 'expand': 'order_items'})
+        order = response.json()['results'][0]
+        self.assertEqual(list(order), ['id', 'order_reference', 'order_items'])
+        self.assertEqual(len(order['order_items']), 2)
+
+
+class StoreSalesRollupTests(OrderTestCase):
+    def statistics(self, store):
+        response = self.client.get('/api/stores/store-statistics', {'store_id': store.id})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rollups_follow_checkout_and_status_changes(self):
+        store = self.stores[0]
+        self.add_order(self.products[:2], quantity=2)
+        self.add_order(self.products[:1], quantity=1)
+
+        statistics = self.statistics(store)
+        self.assertEqual(statistics['total_revenue'], 0)
+        self.assertEqual({row['status']: row['total'] for row in statistics['status_counts']}['Pending'], 2)
+        self.assertEqual(statistics['top_products'][0], {
+            'product_id': self.products[0].id, 'title': self.products[0].title, 'quantity_sold': 3,
+        })
+
+        store_order = StoreOrder.objects.filter(store_reference=store.id).earliest('id')
+        store_order.order_status = 'delivered'
+        store_order.save()
+
+        statistics = self.statistics(store)
+        self.assertEqual(float(statistics['total_revenue']), 200.0)
+        self.assertEqual(statistics['total_delivered_orders'], 1)
+        self.assertEqual(statistics['total_items_sold'], 4)
+
+        chart = self.client.get('/api/stores/sales-chart', {'store_id': store.id, 'period': 'monthly'}).json()
+        self.assertEqual([row['total_items_sold'] for row in chart['sales']], [4])
+
+        # The backfill rebuilds the same rows from the store orders
+        columns = [field.name for field in StoreDailySales._meta.fields if not field.primary_key]
+        maintained = list(StoreDailySales.objects.order_by('store', 'date').values(*columns))
+        call_command('backfill_store_sales', stdout=StringIO())
+        self.assertEqual(list(StoreDailySales.objects.order_by('store', 'date').values(*columns)), maintained)
+        self.assertEqual(self.statistics(store), statistics)
+
+
+class StoreListConditionalTests(StoreCatalogueTestCase):
+    def assertModified(self, etag, modified):
+        response = self.client.get('/api/stores/all-stores', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200 if modified else 304)
+        return response.get('ETag', etag)
+
+    def test_etag_follows_stores_and_products(self):
+        store = self.stocked_store(products=2)
+        etag = self.assertModified('"none"', True)
+        etag = self.assertModified(etag, False)
+
+        product = Product.objects.filter(store_ref=store).first()
+        product.title = 'Renamed'
+        product.save()
+        etag = self.assertModified(etag, True)
+
+        # Deleting a product doesn't move the latest product modification, its store's is touched instead
+        Product.objects.filter(store_ref=store).exclude(id=product.id).get().delete()
+        etag = self.assertModified(etag, True)
 
-# Create your tests here.
+        self.stocked_store(products=0, title='Second')
+        etag = self.assertModified(etag, True)
+        store.delete()
+        self.assertModified(etag, True)
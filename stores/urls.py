@@ -1,11 +1,12 @@
 from django.urls import path
 
+from core.async_views import read_view
 from . import views
 
 urlpatterns = [
     path('add-store',  views.CreateStoreView.as_view(), name='create_store'),
     path('retrieve',  views.GetStoresByOwnerView.as_view(), name='retrieve_store'),
-    path('all-stores',  views.GetStores.as_view(), name='all_stores'),
+    path('all-stores',  read_view(views.GetStores, views.AsyncGetStores), name='all_stores'),
 
     path('store-orders',  views.StoreOrdersListView.as_view(), name='store_orders'),
 
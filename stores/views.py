@@ -1,17 +1,36 @@
-from django.db.models import Sum, Count
+from datetime import datetime, time
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
 from rest_framework.generics import ListAPIView
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from orders.models import OrderItem
+from core.async_db import aprefetch
+from core.async_views import AsyncAPIView, AsyncListMixin
+from core.conditional import conditional_response
+from core.db_router import ReplicaReadMixin
+from core.fieldsets import SparseFieldsViewMixin
+from core.pagination import KeysetPagination
+from products.models import Product
 from orders.serializers import StoreOrderSerializer
-from .models import Store, StoreOrder
+from .models import Store, StoreOrder, StoreDailySales, StoreDailyProductSales
+from .rollups import status_field
 from .serializers import StoreSerializer
-from django.db.models import Sum
 from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
 
 
+def store_list_state(request):
+    # Stores are served with their nested products, so either table changing invalidates the list. Both maxima
+    # are read from the updated_at indexes; deleting a product touches its store, so only stores need counting.
+    stores = Store.objects.aggregate(last_modified=Max('updated_at'), stores=Count('id'))
+    products = Product.objects.aggregate(last_modified=Max('updated_at'))
+    timestamps = [value for value in (stores.pop('last_modified'), products['last_modified']) if value]
+    return {'last_modified': max(timestamps, default=None), **stores}
+
+
 class CreateStoreView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -34,10 +53,10 @@ class GetStoresByOwnerView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Filter stores by the owner (authenticated user)
-        store = Store.objects.filter(owner=request.user).first()
+        # Filter stores by the owner (authenticated user), loading the nested products up front
+        store = StoreSerializer.setup_eager_loading(Store.objects.filter(owner=request.user).order_by('id')).first()
 
-        if not store.exists():
+        if store is None:
             # Return a 404 not found response if no stores are found
             return Response({"message": "No stores found for the authenticated user."},
                             status=status.HTTP_404_NOT_FOUND)
@@ -47,17 +66,78 @@ class GetStoresByOwnerView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class GetStores(ListAPIView):
+class StorePagination(PageNumberPagination):
+    page_size = 10  # Number of items per page
+    page_size_query_param = 'page_size'
+    max_page_size = 100  # Optional, if you want to limit the maximum page size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Keep returning the full list to clients that don't ask for a page
+        if self.page_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class GetStores(ReplicaReadMixin, SparseFieldsViewMixin, ListAPIView):
     # permission_classes = [IsAuthenticated]
     serializer_class = StoreSerializer
+    pagination_class = StorePagination
+    max_products_per_store = 100
+
+    @conditional_response(store_list_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Store.objects.all()
+        return StoreSerializer.setup_eager_loading(Store.objects.order_by('id'), self.get_products_limit(),
+                                                   self.fieldset)
+
+    def get_products_limit(self):
+        # Optionally cap the number of products nested under each store
+        products_limit = self.request.query_params.get('products_per_store')
+        try:
+            products_limit = min(int(products_limit), self.max_products_per_store) if products_limit else None
+        except ValueError:
+            products_limit = None
+
+        if products_limit is not None and products_limit < 1:
+            products_limit = None
+        return products_limit
+
+
+class AsyncGetStores(AsyncListMixin, AsyncAPIView, GetStores):
+    @conditional_response(store_list_state)
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # Products are loaded for the page of stores in aprefetch_related
+        queryset = Store.objects.order_by('id')
+        if self.fieldset is not None:
+            queryset = queryset.only(*StoreSerializer.only_columns(self.fieldset))
+        return queryset
+
+    async def aprefetch_related(self, stores):
+        if self.fieldset is not None and 'store_products' not in self.fieldset:
+            return
 
+        products = StoreSerializer.products_queryset(self.get_products_limit())
+        await aprefetch(stores, StoreSerializer.products_prefetch(products))
 
-class StoreOrdersListView(ListAPIView):
+        # Accessories and variations of those products are independent, so both queries run at the same time
+        await aprefetch([product for store in stores for product in store.prefetched_products],
+                        'accessories', 'variations')
+
+
+class StoreOrdersPagination(KeysetPagination):
+    # Store orders were never paginated, so only page them for clients sending a cursor
+    legacy_page_numbers = False
+
+
+class StoreOrdersListView(SparseFieldsViewMixin, ListAPIView):
     # permission_classes = [IsAuthenticated]
     serializer_class = StoreOrderSerializer
+    pagination_class = StoreOrdersPagination
 
     def get_queryset(self):
         store_id = self.request.query_params.get('store_id', None)
@@ -70,7 +150,9 @@ class StoreOrdersListView(ListAPIView):
         except Store.DoesNotExist:
             return Response({"message": "Store not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        return StoreOrder.objects.filter(store_reference=store_id)
+        # The keyset pagination orders and cuts on its ordering columns, so they are loaded whatever the fieldset
+        return StoreOrderSerializer.setup_eager_loading(StoreOrder.objects.filter(store_reference=store_id),
+                                                        self.fieldset, self.pagination_class.ordering)
 
 
 class StoreOrderStatisticsView(APIView):
@@ -78,46 +160,32 @@ class StoreOrderStatisticsView(APIView):
     def get(self, request):
         store_id = request.query_params.get('store_id', None)
 
-        # Filter by store if store_id is provided
+        # Read from the daily rollups, filtered by store if store_id is provided
         if store_id:
-            orders = StoreOrder.objects.filter(store_reference=store_id)
+            daily_sales = StoreDailySales.objects.filter(store_id=store_id)
+            product_sales = StoreDailyProductSales.objects.filter(store_id=store_id)
         else:
-            orders = StoreOrder.objects.all()
+            daily_sales = StoreDailySales.objects.all()
+            product_sales = StoreDailyProductSales.objects.all()
 
         # Define the possible statuses
         all_statuses = dict(StoreOrder.ORDER_STATUS_CHOICES)
 
-        # Get total orders for each status
-        status_counts = orders.values('order_status').annotate(total=Count('id'))
-
-        # Initialize counts for all statuses, even if they're zero
-        status_counts_dict = {statuc: 0 for statuc in all_statuses.keys()}
-
-        # Update counts with actual data
-        for statuc in status_counts:
-            status_counts_dict[statuc['order_status']] = statuc['total']
+        # Sum every counter in a single query
+        totals = daily_sales.aggregate(
+            total_revenue=Sum('delivered_revenue'),
+            total_items_sold=Sum('delivered_items'),
+            **{statuc: Sum(status_field(statuc)) for statuc in all_statuses.keys()}
+        )
 
         # Format status data for the response
         formatted_status_counts = [
-            {"status": all_statuses[statuc], "total": total}
-            for statuc, total in status_counts_dict.items()
+            {"status": label, "total": totals[statuc] or 0}
+            for statuc, label in all_statuses.items()
         ]
 
-        # Calculate total revenue only for delivered orders
-        total_revenue = orders.filter(order_status='delivered').aggregate(
-            total_revenue=Sum('order_items__price')
-        )['total_revenue'] or 0
-
-        # Get the total number of delivered orders
-        total_orders = orders.filter(order_status='delivered').count()
-
-        # Get total number of items sold
-        total_items_sold = orders.filter(order_status='delivered').aggregate(
-            total_items=Sum('order_items__quantity')
-        )['total_items'] or 0
-
         # Retrieve the top 3 products by total quantity sold
-        top_products = OrderItem.objects.filter(store_orders__in=orders).values('product', 'product__title').annotate(
+        top_products = product_sales.values('product', 'product__title').annotate(
             total_quantity=Sum('quantity')
         ).order_by('-total_quantity')[:3]
 
@@ -130,9 +198,9 @@ class StoreOrderStatisticsView(APIView):
 
         # Prepare statistics for response
         statistics = {
-            'total_revenue': total_revenue,
-            'total_delivered_orders': total_orders,
-            'total_items_sold': total_items_sold,
+            'total_revenue': totals['total_revenue'] or 0,
+            'total_delivered_orders': totals['delivered'] or 0,
+            'total_items_sold': totals['total_items_sold'] or 0,
             'status_counts': formatted_status_counts,
             'top_products': top_products_data
         }
@@ -146,10 +214,8 @@ class SalesChartDataView(APIView):
         period = request.query_params.get('period', 'daily')
         store_id = request.query_params.get('store_id', None)
 
-        if store_id:
-            store_orders = StoreOrder.objects.filter(store_reference=store_id, order_status='delivered')
-        else:
-            Response({"message": "Store id is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if not store_id:
+            return Response({"message": "Store id is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check for valid period ('daily', 'weekly', 'monthly', 'yearly')
         if period not in ['daily', 'weekly', 'monthly', 'yearly']:
@@ -165,22 +231,28 @@ class SalesChartDataView(APIView):
         elif period == 'yearly':
             trunc_function = TruncYear
 
-        # Annotate and aggregate sales data based on the selected period
-        sales_data = store_orders.annotate(
-            period=trunc_function('created_at')  # Group by the selected period
+        # Derive the selected period from the daily rollups of delivered orders
+        sales_data = StoreDailySales.objects.filter(store_id=store_id, delivered_orders__gt=0).annotate(
+            period=trunc_function('date')  # Group by the selected period
         ).values('period').annotate(
-            total_sales=Sum('order_items__price'),  # Sum the total sales for that period
-            total_items_sold=Sum('order_items__quantity')  # Sum the total items sold for that period
+            total_sales=Sum('delivered_revenue'),  # Sum the total sales for that period
+            total_items_sold=Sum('delivered_items')  # Sum the total items sold for that period
         ).order_by('period')
 
         # If no sales data exists, return a message
         if not sales_data:
             return Response({"message": "No sales data available."}, status=status.HTTP_404_NOT_FOUND)
 
+        # Report each period as the start of its day, as when it was truncated from created_at
+        sales = [
+            {**row, 'period': datetime.combine(row['period'], time.min, tzinfo=timezone.get_current_timezone())}
+            for row in sales_data
+        ]
+
         # Format response
         chart_data = {
             "period": period,
-            "sales": list(sales_data)  # List of dicts with period, total_sales, and total_items_sold
+            "sales": sales  # List of dicts with period, total_sales, and total_items_sold
         }
 
         return Response(chart_data, status=status.HTTP_200_OK)